@@ -1,77 +1,151 @@
+import copy
+import functools
 import json
 import os
+import string
+import tempfile
 import time
+import types
+
+try:
+    # Optional: much faster JSON serialization for save_config
+    import orjson
+except ImportError:
+    orjson = None
+
+from config.watch import watch_file
+
+_HEX_DIGITS = frozenset(string.hexdigits)
+
+# Color conversions are pure functions of a handful of distinct values (config form
+# renders/POSTs); memoized at module level so the cache isn't tied to an instance.
+@functools.lru_cache(maxsize=64)
+def _hex_to_rgb(hex_color):
+    hex_color = hex_color.lstrip('#')
+    if len(hex_color) == 3:  # Handles shorthand like #FFF
+        hex_color = hex_color[0] * 2 + hex_color[1] * 2 + hex_color[2] * 2
+    # int(..., 16) alone would also accept '0x12ab', '+12345' or '12_345'
+    if len(hex_color) != 6 or not _HEX_DIGITS.issuperset(hex_color):
+        raise ValueError("Invalid hex color format")
+    value = int(hex_color, 16)  # single C-level parse, then split via bit shifts
+    return (value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF
+
+
+@functools.lru_cache(maxsize=64)
+def _rgb_to_hex(rgb_color):
+    r, g, b = rgb_color
+    return '#%06x' % ((r << 16) | (g << 8) | b)
+
+
+@functools.lru_cache(maxsize=64)
+def _rgba_string(rgb_color, alpha):
+    return 'rgba({}, {}, {}, {})'.format(*rgb_color, alpha)
+
 
 data_folder = '/data'
 known_faces_folder = os.path.join(data_folder, 'knownfaces')
 config_file = os.path.join(data_folder, 'config.json')
 
 
+# Built once at import time; use initialize_app_structure() for a mutable copy.
+_DEFAULT_MESSAGE_TEMPLATE = json.dumps({
+    'name': '[[name]]',
+    'image_url': '[[image_url]]',
+    'time': '[[time]]',
+    'date': '[[date]]',
+    'timestamp': '[[timestamp]]'
+})
+
+_DEFAULT_CONFIG = types.MappingProxyType({
+    'input_stream_url': '',
+    'overlay_color': [220, 220, 200],
+    'overlay_transparency': 0.5,
+    'overlay_border': 1,
+    'enable_face_overlay': True,
+    'output_width': 640,
+    'output_height': 480,
+    'notification_delay': 60,  # Zeit in Sekunden
+    'custom_message_udp': _DEFAULT_MESSAGE_TEMPLATE,
+    'custom_message_http': _DEFAULT_MESSAGE_TEMPLATE,
+    'use_udp': False,
+    'use_web': False,
+    'use_loxone_vti': False,
+    'loxone_ip': '',
+    'loxone_user': '',
+    'loxone_pass': '',
+    'loxone_text_input': '',
+    'web_service_url': '',
+    'udp_service_port': 0,
+    'udp_service_url': '',
+    # If enabled, Face Recognition runs automatically every N frames.
+    # If disabled, Face Recognition runs only via manual /trigger.
+    'enable_stream_suspend': False,
+    'stream_suspend_grace_seconds': 10,
+    'enable_face_recognition_interval': True,
+    'face_recognition_interval': 60,
+    'face_scale_factor': 0.75,
+    # Upsample factor for face detection; helps detect smaller faces.
+    # 0 = none, 1–2 = common, 3 = heavy (CPU expensive)
+    'face_upsample_times': 1,
+    # Force upsample=0 when face_scale_factor <= 0.5 (detection on the downscaled frame only)
+    'auto_upsample': True,
+    # Smallest face (px in the camera frame) that must be found; with hog this picks the
+    # detection scale (1, 1/2 or 1/4) and disables upsampling. 0 = use face_scale_factor
+    'min_face_size': 0,
+    'face_detection_model': 'hog',
+    # Frames per batched CNN detection call (only with a CUDA-enabled dlib; 1 = off)
+    'detection_batch': 1,
+    # Worker processes for detection/encoding (0 = detector thread only); each loads its own dlib models
+    'detector_processes': 0,
+    # Preprocess the next frame on a second thread while the current one is detected/encoded
+    # (in-thread detection only; disables detection_batch)
+    'pipeline_preprocess': False,
+    # OpenCV tracker between detections: auto (KCF, then fallbacks), kcf, csrt, mosse, mil
+    'tracker_type': 'auto',
+    # Run trackers on a downscaled frame (1.0 = full resolution, 0.5 = quarter of the pixels)
+    'tracker_scale': 1.0,
+    'face_match_threshold': 0.55,
+    'enable_clahe': False,
+    'enable_blur_filter': False,
+    # Run resize/CLAHE/color conversion on the GPU (needs a CUDA-enabled OpenCV build)
+    'enable_cuda_preproc': False,
+    # Same preprocessing through OpenCV's OpenCL T-API (cv2.UMat), e.g. on an integrated GPU
+    'enable_opencl': False,
+    'blur_threshold': 100.0,
+    'eventimage_cleanup_days': 0,
+    # JPEG quality of saved event images (1-100)
+    'event_image_quality': 85,
+    # JPEG quality of the MJPEG stream (lower = cheaper to encode, less bandwidth)
+    'stream_jpeg_quality': 80,
+    'image_path': os.path.join('/data', 'saved_faces'),
+    'log_file': os.path.join('/data', 'event_log.json'),
+    # Newest event log entries returned to the GUI (0 = all)
+    'event_log_limit': 500
+})
+
+
 def initialize_app_structure():
-    default_config = {
-        'input_stream_url': '',
-        'overlay_color': [220, 220, 200],
-        'overlay_transparency': 0.5,
-        'overlay_border': 1,
-        'enable_face_overlay': True,
-        'output_width': 640,
-        'output_height': 480,
-        'notification_delay': 60,  # Zeit in Sekunden
-        'custom_message_udp': json.dumps({
-            'name': '[[name]]',
-            'image_url': '[[image_url]]',
-            'time': '[[time]]',
-            'date': '[[date]]',
-            'timestamp': '[[timestamp]]'
-        }),
-        'custom_message_http': json.dumps({
-            'name': '[[name]]',
-            'image_url': '[[image_url]]',
-            'time': '[[time]]',
-            'date': '[[date]]',
-            'timestamp': '[[timestamp]]'
-        }),
-        'use_udp': False,
-        'use_web': False,
-        'use_loxone_vti': False,
-        'loxone_ip': '',
-        'loxone_user': '',
-        'loxone_pass': '',
-        'loxone_text_input': '',
-        'web_service_url': '',
-        'udp_service_port': 0,
-        'udp_service_url': '',
-        # If enabled, Face Recognition runs automatically every N frames.
-        # If disabled, Face Recognition runs only via manual /trigger.
-        'enable_stream_suspend': False,
-        'stream_suspend_grace_seconds': 10,
-        'enable_face_recognition_interval': True,
-        'face_recognition_interval': 60,
-        'face_scale_factor': 0.75,
-        # Upsample factor for face detection; helps detect smaller faces.
-        # 0 = none, 1–2 = common, 3 = heavy (CPU expensive)
-        'face_upsample_times': 1,
-        'face_detection_model': 'hog',
-        'face_match_threshold': 0.55,
-        'enable_clahe': False,
-        'enable_blur_filter': False,
-        'blur_threshold': 100.0,
-        'eventimage_cleanup_days': 0,
-        'image_path': os.path.join('/data', 'saved_faces'),
-        'log_file': os.path.join('/data', 'event_log.json')
-    }
-    return default_config
+    return copy.deepcopy(dict(_DEFAULT_CONFIG))
 
 
 class ConfigManager:
     def __init__(self, filepath):
         self.filepath = filepath
         self.config = {}
-        self._mtime = None
+        # (st_mtime_ns, st_size) of the loaded file
+        self._stat_key = None
         # Throttle reload checks to avoid filesystem syscalls in hot paths.
         # Live reload stays functional, but we won't stat() the config file on every get().
         self.reload_interval = 1.0  # seconds
         self._last_check_ts = 0.0
+        # With inotify, reload checks only happen after the file was written/replaced.
+        self._dirty = False
+        self._watching = self._start_watcher()
+        # Cached, read-only view of self.config plus pre-parsed message templates.
+        # Rebuilt only when the config is (re)loaded or saved.
+        self._snapshot = types.MappingProxyType({})
+        self._parsed_udp_template = None
+        self._parsed_http_template = None
         self.load_config()
 
     def load_config(self):
@@ -80,42 +154,99 @@ class ConfigManager:
         try:
             with open(self.filepath, 'r') as json_file:
                 self.config = json.load(json_file)
-                try:
-                    self._mtime = os.path.getmtime(self.filepath)
-                except OSError:
-                    self._mtime = None
-                if 'eventimage_cleanup_days' not in self.config:
-                    self.config['eventimage_cleanup_days'] = 0
+                self._stat_key = self._current_stat_key()
                 # New options (backwards compatible)
-                if 'enable_stream_suspend' not in self.config:
-                    self.config['enable_stream_suspend'] = False
-                if 'stream_suspend_grace_seconds' not in self.config:
-                    self.config['stream_suspend_grace_seconds'] = 10
-                if 'face_upsample_times' not in self.config:
-                    self.config['face_upsample_times'] = 1
+                for key, value in _DEFAULT_CONFIG.items():
+                    if key not in self.config:
+                        self.config[key] = copy.deepcopy(value)
+            self._rebuild_cache()
         except json.JSONDecodeError as e:
             raise json.JSONDecodeError(f"Error reading config file {self.filepath}: {e.msg}")
 
     def save_config(self):
         try:
-            with open(self.filepath, 'w') as json_file:
-                json.dump(self.config, json_file, indent=4)
+            # Same 2-space layout with or without orjson (orjson only supports indent 2)
+            if orjson is not None:
+                data = orjson.dumps(self.config, option=orjson.OPT_INDENT_2)
+            else:
+                data = json.dumps(self.config, indent=2).encode('utf-8')
+            # Write a unique temp file and swap it in, so a crash never leaves a truncated
+            # config and concurrent saves (threaded frontend) never share one temp file
+            fd, tmp_path = tempfile.mkstemp(prefix='.config.', suffix='.tmp',
+                                            dir=os.path.dirname(os.path.abspath(self.filepath)))
+            try:
+                # mkstemp creates 0600; keep the previous world-readable mode
+                os.fchmod(fd, 0o644)
+                with os.fdopen(fd, 'wb') as json_file:
+                    json_file.write(data)
+                    json_file.flush()
+                    os.fsync(json_file.fileno())
+                os.replace(tmp_path, self.filepath)
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+            # Remember our own write so _reload_if_changed doesn't read it straight back
+            self._stat_key = self._current_stat_key()
         except Exception as e:
             raise IOError(f"Error saving config file '{self.filepath}': {e}")
+        self._rebuild_cache()
 
-    def _reload_if_changed(self):
-        """Reload config from disk if the file changed (throttled)."""
-        now = time.monotonic()
-        # Only check mtime every reload_interval seconds
-        if (now - self._last_check_ts) < self.reload_interval:
-            return
-        self._last_check_ts = now
+    @staticmethod
+    def _parse_template(raw):
+        """Parse a custom message template into a dict, or None if it is not a JSON object."""
+        if isinstance(raw, dict):
+            return raw
+        if not isinstance(raw, str):
+            return None
+        try:
+            parsed = json.loads(raw)
+        except ValueError:
+            return None
+        return parsed if isinstance(parsed, dict) else None
+
+    def _rebuild_cache(self):
+        """Rebuild the read-only snapshot and the pre-parsed message templates."""
+        self._snapshot = types.MappingProxyType(self.config.copy())
+        self._parsed_udp_template = self._parse_template(self.config.get('custom_message_udp'))
+        self._parsed_http_template = self._parse_template(self.config.get('custom_message_http'))
 
+    def _current_stat_key(self):
         try:
-            mtime = os.path.getmtime(self.filepath)
+            st = os.stat(self.filepath)
         except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _start_watcher(self) -> bool:
+        """Watch the config file via inotify; returns False if unavailable (poll fallback)."""
+        return watch_file(self.filepath, self._on_file_changed, on_stop=self._on_watch_stopped)
+
+    def _on_file_changed(self):
+        self._dirty = True
+
+    def _on_watch_stopped(self):
+        self._watching = False
+
+    def _reload_if_changed(self):
+        """Reload config from disk if the file changed (inotify-driven, else throttled poll)."""
+        if self._watching:
+            if not self._dirty:
+                return
+            self._dirty = False
+        else:
+            now = time.monotonic()
+            # Only check mtime every reload_interval seconds
+            if (now - self._last_check_ts) < self.reload_interval:
+                return
+            self._last_check_ts = now
+
+        stat_key = self._current_stat_key()
+        if stat_key is None:
             return
-        if self._mtime is None or mtime != self._mtime:
+        if self._stat_key is None or stat_key != self._stat_key:
             self.load_config()
 
     def get(self, key, default=None):
@@ -123,10 +254,29 @@ class ConfigManager:
         return self.config.get(key, default)
 
     def get_snapshot(self):
-        """Return a stable (shallow) copy of the current config after a throttled reload check."""
+        """Return a read-only view of the current config after a throttled reload check.
+
+        The view is cached and only rebuilt when the config is reloaded or saved,
+        so callers in hot loops don't pay for a dict copy on every call.
+        """
         self._reload_if_changed()
-        # Shallow copy is enough because we mostly store primitives/lists.
-        return dict(self.config)
+        return self._snapshot
+
+    def get_udp_template(self):
+        """Return the pre-parsed UDP message template (dict) or None if it is not JSON.
+
+        The returned dict is shared; callers must not mutate it.
+        """
+        self._reload_if_changed()
+        return self._parsed_udp_template
+
+    def get_http_template(self):
+        """Return the pre-parsed HTTP message template (dict) or None if it is not JSON.
+
+        The returned dict is shared; callers must not mutate it.
+        """
+        self._reload_if_changed()
+        return self._parsed_http_template
 
     def set(self, key, value):
         self.config[key] = value
@@ -134,24 +284,17 @@ class ConfigManager:
 
     def hex_to_rgb(self, hex_color):
         """Converts a Hex color value to an RGB tuple."""
-        hex_color = hex_color.lstrip('#')
-        if len(hex_color) == 3:  # Handles shorthand like #FFF
-            hex_color = ''.join([c * 2 for c in hex_color])
-        try:
-            return tuple(int(hex_color[i:i + 2], 16) for i in (0, 2, 4))
-        except ValueError:
-            raise ValueError("Invalid hex color format")
+        return _hex_to_rgb(hex_color)
 
     def rgb_to_hex(self, rgb_color):
         """Konvertiert ein RGB-Tupel in einen Hex-Farbwert."""
-        return '#{:02x}{:02x}{:02x}'.format(*rgb_color)
+        return _rgb_to_hex(tuple(rgb_color))
 
     def get_rgba_overlay(self):
         """Calculates the RGBA value for the overlay based on the overlay color in the configuration."""
         try:
             rgb_color = self.get('overlay_color', [220, 220, 200])  # Default color if none specified
             alpha = 1 - self.get('overlay_transparency', 0.5)
-            rgba_color = 'rgba({}, {}, {}, {})'.format(*rgb_color, alpha)
-            return rgba_color
+            return _rgba_string(tuple(rgb_color), alpha)
         except Exception as e:
             raise ValueError("Error calculating RGBA overlay: {}".format(e))
\ No newline at end of file
@@ -0,0 +1,89 @@
+import logging
+import os
+import threading
+
+try:
+    # Optional: event-driven file watching on Linux
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+    inotify_flags = None
+
+
+class _FileWatcher:
+    """One inotify instance and reader thread per process, shared by all watch_file() callers.
+
+    Directories are watched (not the files), so atomic replaces via os.replace and
+    files that don't exist yet are seen as well. Callbacks run on the watcher thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inotify = None
+        self._thread = None
+        self._failed = False
+        # wd -> {filename: [on_change, ...]}
+        self._callbacks = {}
+        self._on_stop = []
+
+    def watch(self, path, on_change, on_stop=None) -> bool:
+        if INotify is None:
+            return False
+        directory = os.path.dirname(os.path.abspath(path))
+        filename = os.path.basename(path)
+        mask = (inotify_flags.CREATE | inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO
+                | inotify_flags.DELETE | inotify_flags.MOVED_FROM)
+        with self._lock:
+            if self._failed:
+                return False
+            try:
+                if self._inotify is None:
+                    self._inotify = INotify()
+                # Same mask for every caller, so re-adding a directory returns the same wd
+                wd = self._inotify.add_watch(directory, mask)
+            except OSError as e:
+                logging.debug(f"inotify unavailable for {directory}: {e}")
+                return False
+            self._callbacks.setdefault(wd, {}).setdefault(filename, []).append(on_change)
+            if on_stop is not None:
+                self._on_stop.append(on_stop)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='file-watcher', daemon=True)
+                self._thread.start()
+        return True
+
+    def _run(self):
+        try:
+            while True:
+                for event in self._inotify.read():
+                    with self._lock:
+                        callbacks = list(self._callbacks.get(event.wd, {}).get(event.name, ()))
+                    for callback in callbacks:
+                        try:
+                            callback()
+                        except Exception as e:
+                            logging.debug(f"File watcher callback failed: {e}")
+        except Exception as e:
+            logging.debug(f"File watcher stopped: {e}")
+        with self._lock:
+            self._failed = True
+            on_stop, self._on_stop = self._on_stop, []
+        # Let every caller fall back to polling
+        for callback in on_stop:
+            try:
+                callback()
+            except Exception as e:
+                logging.debug(f"File watcher stop callback failed: {e}")
+
+
+_WATCHER = _FileWatcher()
+
+
+def watch_file(path, on_change, on_stop=None) -> bool:
+    """Call on_change() whenever `path` is created, written, replaced or removed.
+
+    Returns False if inotify is unavailable; the caller then polls instead. on_stop()
+    is called if the shared watcher thread dies later on, so the caller can switch
+    to polling at that point.
+    """
+    return _WATCHER.watch(path, on_change, on_stop)
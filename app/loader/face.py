@@ -1,23 +1,84 @@
 import re
 import os
+import json
+import mmap
+import struct
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
+# Optional version suffix in legacy filenames, e.g. "name.v1"
+_VERSION_SUFFIX_RE = re.compile(r"\.v\d+$", re.IGNORECASE)
+_ENCODING_SUFFIX = '_opt.npy'
+# Header of the packed bank file: magic, face count, length of the UTF-8 JSON metadata
+_BANK_MAGIC = b'FSB1'
+_BANK_HEADER = struct.Struct('<4sII')
+# The float32 payload starts on a 16-byte boundary behind the metadata
+_BANK_ALIGN = 16
+
+# Lazily compiled numba kernel: None = not tried yet, False = numba unavailable
+_sqdist_kernel = None
+
+
+def _get_sqdist_kernel():
+    """Return a parallel numba squared-distance kernel, or None if numba is not installed."""
+    global _sqdist_kernel
+    if _sqdist_kernel is None:
+        try:
+            from numba import njit, prange
+        except ImportError:
+            _sqdist_kernel = False
+            return None
+
+        @njit(parallel=True, fastmath=True, cache=True)
+        def _sqdist(known, q, out):
+            n, dim = known.shape
+            for i in prange(n):
+                acc = 0.0
+                for k in range(dim):
+                    d = known[i, k] - q[k]
+                    acc += d * d
+                out[i] = acc
+
+        _sqdist_kernel = _sqdist
+    return _sqdist_kernel or None
+
 
 class FaceLoader:
+    # Packed cache of all known encodings, rebuilt whenever the *_opt.npy inputs change.
+    # One file: header, JSON {signature, names}, then the Nx128 float32 matrix.
+    BANK_FILE = '_bank.bin'
+    # Two-file layout of earlier versions, removed once the bank has been written
+    LEGACY_INDEX_FILES = ('_index.npy', '_names.json')
+    # Large galleries are scanned via an int8 copy first; the best candidates are re-ranked in float32.
+    QUANTIZE_MIN_FACES = 1024
+    QUANTIZE_CANDIDATES = 8
+    # Above this size get_name() uses the numba kernel if numba is installed (below QUANTIZE_MIN_FACES).
+    NUMBA_MIN_FACES = 256
+    # Above this size get_name()/get_names_batch() search an exact faiss IndexFlatL2 if faiss is
+    # installed; above FAISS_IVF_MIN_FACES an IndexIVFFlat (approximate, FAISS_IVF_NPROBE lists probed).
+    FAISS_MIN_FACES = 4096
+    FAISS_IVF_MIN_FACES = 65536
+    FAISS_IVF_NPROBE = 8
+
     def __init__(self, config_manager=None):
         img_dir = os.path.join('/data', 'knownfaces')
         self.config_manager = config_manager
         # Store encodings compactly as float32 Nx128 for lower RAM and faster distance calcs.
-        self.known_face_encodings = []  # temporary list, finalized to np.ndarray
+        self.known_face_encodings = np.empty((0, 128), dtype=np.float32)
         self.known_face_names = []
+        # Precomputed squared norms ||a||^2 of the known encodings (see get_name).
+        self._known_sq = np.empty((0,), dtype=np.float32)
+        # Optional int8 copy of the known encodings (see _quantize_known).
+        self._known_q = None
+        self._known_q_sq = None
+        self._q_mul = 1.0
+        # Output buffer for the numba kernel (allocated on first use)
+        self._d2_buf = None
+        # Optional faiss index over the known encodings (see _build_faiss_index)
+        self._faiss_index = None
         self.load_known_faces(img_dir)
 
-        # Finalize storage format
-        if self.known_face_encodings:
-            self.known_face_encodings = np.asarray(self.known_face_encodings, dtype=np.float32)
-        else:
-            self.known_face_encodings = np.empty((0, 128), dtype=np.float32)
-
     @staticmethod
     def _normalize_person_name(name: str) -> str:
         # Strip optional quotes and whitespace
@@ -29,9 +90,151 @@ class FaceLoader:
         # Backwards compatible: allow filenames like "name.v1.jpg" but return "name"
         stem = os.path.splitext(os.path.basename(filename))[0]
         stem = FaceLoader._normalize_person_name(stem)
-        stem = re.sub(r"\.v\d+$", "", stem, flags=re.IGNORECASE)
+        stem = _VERSION_SUFFIX_RE.sub("", stem)
         return stem
 
+    @staticmethod
+    def _scandir_sorted(directory: str):
+        with os.scandir(directory) as it:
+            return sorted(it, key=lambda e: e.name)
+
+    @classmethod
+    def _collect_encoding_files(cls, directory: str):
+        """Return a sorted list of (person_name, file_path, stat_result) for all *_opt.npy encodings.
+
+        Uses os.scandir so type checks come from the directory listing itself.
+        """
+        files = []
+        for entry in cls._scandir_sorted(directory):
+            # Subfolder per person
+            if entry.is_dir():
+                person_name = cls._normalize_person_name(entry.name)
+                if not person_name:
+                    continue
+                for sub in cls._scandir_sorted(entry.path):
+                    if sub.name.lower().endswith(_ENCODING_SUFFIX) and sub.is_file():
+                        files.append((person_name, sub.path, sub.stat()))
+                continue
+
+            # Legacy flat files in /knownfaces
+            if entry.name.lower().endswith(_ENCODING_SUFFIX) and entry.is_file():
+                person_name = cls._name_from_filename(entry.name.replace(_ENCODING_SUFFIX, ''))
+                files.append((person_name, entry.path, entry.stat()))
+        return files
+
+    @staticmethod
+    def _signature(directory: str, files):
+        """Cheap change signature over the encoding files (path, mtime, size)."""
+        return [[os.path.relpath(path, directory), st.st_mtime_ns, st.st_size] for _, path, st in files]
+
+    @staticmethod
+    def _load_encoding(file_path: str):
+        """Load one *_opt.npy file as a flat float32 (128,) vector, or None if unusable."""
+        try:
+            enc = np.asarray(np.load(file_path)).reshape(-1)
+            if enc.shape[0] != 128:
+                return None
+            return enc.astype(np.float32, copy=False)
+        except Exception:
+            return None
+
+    @staticmethod
+    def _read_bank(bank_path: str):
+        """Return (signature, names, encodings) from the bank file, or None if unusable.
+
+        The encodings are a read-only view straight into the mmap: no copy and no
+        per-file header parsing.
+        """
+        try:
+            with open(bank_path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        try:
+            magic, count, meta_len = _BANK_HEADER.unpack_from(mm, 0)
+            if magic != _BANK_MAGIC:
+                return None
+            meta_end = _BANK_HEADER.size + meta_len
+            meta = json.loads(mm[_BANK_HEADER.size:meta_end].decode('utf-8'))
+            names = list(meta.get('names', []))
+            payload_off = -(-meta_end // _BANK_ALIGN) * _BANK_ALIGN
+            if len(names) != count or payload_off + count * 128 * 4 != len(mm):
+                return None
+            encodings = np.frombuffer(mm, dtype=np.float32, count=count * 128,
+                                      offset=payload_off).reshape(count, 128)
+            return meta.get('signature'), names, encodings
+        except Exception:
+            return None
+
+    @staticmethod
+    def _write_bank(bank_path: str, sig, names, encodings):
+        """Write the bank file atomically (temp file + os.replace)."""
+        meta = json.dumps({'signature': sig, 'names': names}).encode('utf-8')
+        meta_end = _BANK_HEADER.size + len(meta)
+        padding = -meta_end % _BANK_ALIGN
+        # Unique temp file per writer; '.tmp' so it can never match the *_opt.npy scan
+        fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(bank_path) + '.', suffix='.tmp',
+                                        dir=os.path.dirname(bank_path))
+        try:
+            # mkstemp creates 0600; keep the previous world-readable mode
+            os.fchmod(fd, 0o644)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_BANK_HEADER.pack(_BANK_MAGIC, len(names), len(meta)))
+                f.write(meta)
+                f.write(b'\0' * padding)
+                f.write(np.ascontiguousarray(encodings, dtype='<f4').tobytes())
+            os.replace(tmp_path, bank_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def _build_or_load_index(cls, directory: str):
+        """Return (encodings Nx128 float32, names) from the packed bank, rebuilding it if stale.
+
+        When the signature matches, the matrix is memory-mapped read-only instead of
+        opening every *_opt.npy file.
+        """
+        files = cls._collect_encoding_files(directory)
+        sig = cls._signature(directory, files)
+        bank_path = os.path.join(directory, cls.BANK_FILE)
+
+        bank = cls._read_bank(bank_path)
+        if bank is not None and bank[0] == sig:
+            return bank[2], bank[1]
+
+        # Rebuild: overlap the per-file open/read latency with a small thread pool.
+        paths = [file_path for _, file_path, _ in files]
+        if len(paths) > 1:
+            with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as ex:
+                loaded = list(ex.map(cls._load_encoding, paths))
+        else:
+            loaded = [cls._load_encoding(p) for p in paths]
+
+        encodings = np.empty((len(files), 128), dtype=np.float32)
+        names = []
+        for (person_name, _, _), enc in zip(files, loaded):
+            if enc is None:
+                continue
+            encodings[len(names)] = enc
+            names.append(person_name)
+        encodings = encodings[:len(names)]
+
+        try:
+            cls._write_bank(bank_path, sig, names, encodings)
+            for legacy in cls.LEGACY_INDEX_FILES:
+                try:
+                    os.remove(os.path.join(directory, legacy))
+                except FileNotFoundError:
+                    pass
+        except Exception as e:
+            print(f"Failed to write known faces index: {e}")
+
+        return encodings, names
+
     def load_known_faces(self, directory: str):
         """Load ONLY precomputed encodings (*.npy).
 
@@ -40,71 +243,151 @@ class FaceLoader:
           /data/knownfaces/<PersonName>/*_opt.npy  (preferred)
         Legacy flat layout is also supported:
           /data/knownfaces/<name>_opt.npy
+        All encodings are packed into /data/knownfaces/_bank.bin, which is
+        memory-mapped on later starts while the inputs are unchanged.
         """
         try:
             if not os.path.isdir(directory):
                 return
-
-            for entry in sorted(os.listdir(directory)):
-                entry_path = os.path.join(directory, entry)
-
-                # Subfolder per person
-                if os.path.isdir(entry_path):
-                    person_name = self._normalize_person_name(entry)
-                    if not person_name:
-                        continue
-
-                    npy_files = [fn for fn in sorted(os.listdir(entry_path))
-                                 if fn.lower().endswith('_opt.npy')]
-
-                    for fn in npy_files:
-                        file_path = os.path.join(entry_path, fn)
-                        try:
-                            enc = np.load(file_path)
-                            enc = np.asarray(enc).reshape(-1)
-                            if enc.shape[0] != 128:
-                                continue
-                            self.known_face_encodings.append(enc.astype(np.float32, copy=False))
-                            self.known_face_names.append(person_name)
-                        except Exception:
-                            continue
-                    continue
-
-                # Legacy flat files in /knownfaces
-                if entry.lower().endswith('_opt.npy') and os.path.isfile(entry_path):
-                    person_name = self._name_from_filename(entry.replace('_opt.npy', ''))
-                    try:
-                        enc = np.load(entry_path)
-                        enc = np.asarray(enc).reshape(-1)
-                        if enc.shape[0] != 128:
-                            continue
-                        self.known_face_encodings.append(enc.astype(np.float32, copy=False))
-                        self.known_face_names.append(person_name)
-                    except Exception:
-                        continue
-
+            self.known_face_encodings, self.known_face_names = self._build_or_load_index(directory)
+            self._known_sq = np.einsum('ij,ij->i', self.known_face_encodings, self.known_face_encodings)
+            self._quantize_known()
+            self._build_faiss_index()
         except FileNotFoundError:
             print(f"Directory {directory} not found.")
         except Exception as e:
             print(f"Failed to load known faces: {e}")
 
 
-    def get_name(self, face_encoding):
-        if self.known_face_encodings.shape[0] == 0:
-            return "Unknown"
-        # Fast squared Euclidean in float32 (avoid temporary float64 conversions)
-        fe = np.asarray(face_encoding, dtype=np.float32)
-        diff = self.known_face_encodings - fe
-        d2 = np.einsum("ij,ij->i", diff, diff)
-        best_match_index = int(np.argmin(d2))
+    def _quantize_known(self):
+        """Build the int8 copy of the gallery (4x less memory traffic per scan) for large N."""
+        self._known_q = None
+        self._known_q_sq = None
+        if self.known_face_encodings.shape[0] < self.QUANTIZE_MIN_FACES:
+            return
+        max_abs = float(np.max(np.abs(self.known_face_encodings)))
+        if max_abs <= 0.0:
+            return
+        self._q_mul = 127.0 / max_abs
+        self._known_q = self._quantize(self.known_face_encodings)
+        self._known_q_sq = np.einsum('ij,ij->i', self._known_q, self._known_q, dtype=np.int32)
+
+    def _build_faiss_index(self):
+        """Exact L2 index for very large galleries; stays None without faiss."""
+        self._faiss_index = None
+        if self.known_face_encodings.shape[0] < self.FAISS_MIN_FACES:
+            return
+        try:
+            import faiss
+        except ImportError:
+            return
+        data = np.ascontiguousarray(self.known_face_encodings, dtype=np.float32)
+        n, dim = data.shape
+        if n >= self.FAISS_IVF_MIN_FACES:
+            nlist = int(np.sqrt(n))
+            index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, nlist)
+            index.train(data)
+            index.nprobe = self.FAISS_IVF_NPROBE
+        else:
+            index = faiss.IndexFlatL2(dim)
+        index.add(data)
+        self._faiss_index = index
+
+    def _quantize(self, x):
+        return np.clip(np.rint(x * self._q_mul), -127, 127).astype(np.int8)
 
+    def _match_threshold(self) -> float:
         threshold = 0.55
         if self.config_manager is not None:
             try:
                 threshold = float(self.config_manager.get('face_match_threshold', threshold))
             except Exception:
                 pass
+        return threshold
+
+    def get_name(self, face_encoding):
+        if self.known_face_encodings.shape[0] == 0:
+            return "Unknown"
+        # Squared Euclidean via ||a-b||^2 = ||a||^2 + ||b||^2 - 2*a.b:
+        # one float32 GEMV against the known matrix, no NxD temporary.
+        fe = np.ascontiguousarray(face_encoding, dtype=np.float32).reshape(-1)
+        n = self.known_face_encodings.shape[0]
+        # int8 shortlist (quantized galleries) goes before the float32 numba scan: it reads
+        # a quarter of the bytes and only re-ranks QUANTIZE_CANDIDATES rows in float32.
+        kernel = _get_sqdist_kernel() if (n > self.NUMBA_MIN_FACES and self._known_q is None) else None
+        if self._faiss_index is not None:
+            dist, idx = self._faiss_index.search(fe.reshape(1, -1), 1)
+            best_match_index = int(idx[0, 0])
+            if best_match_index < 0:
+                # IVF probe found no candidate
+                return "Unknown"
+            best_d2 = dist[0, 0]
+        elif self._known_q is not None:
+            # Coarse int8 scan (int32 accumulation), then exact float32 distance on the shortlist.
+            q = self._quantize(fe)
+            dots_q = np.einsum('ij,j->i', self._known_q, q, dtype=np.int32)
+            d2_q = self._known_q_sq - 2 * dots_q
+            k = min(self.QUANTIZE_CANDIDATES, d2_q.shape[0])
+            candidates = np.argpartition(d2_q, k - 1)[:k]
+            dots = self.known_face_encodings[candidates] @ fe
+            d2 = self._known_sq[candidates] + float(fe @ fe) - 2.0 * dots
+            best = int(np.argmin(d2))
+            best_match_index = int(candidates[best])
+            best_d2 = d2[best]
+        elif kernel is not None:
+            # Fused, multi-threaded exact distance scan without temporaries
+            if self._d2_buf is None or self._d2_buf.shape[0] != n:
+                self._d2_buf = np.empty(n, dtype=np.float32)
+            kernel(self.known_face_encodings, fe, self._d2_buf)
+            best_match_index = int(np.argmin(self._d2_buf))
+            best_d2 = self._d2_buf[best_match_index]
+        else:
+            dots = self.known_face_encodings @ fe
+            d2 = self._known_sq + float(fe @ fe) - 2.0 * dots
+            best_match_index = int(np.argmin(d2))
+            best_d2 = d2[best_match_index]
 
-        if d2[best_match_index] < (threshold * threshold):
+        threshold = self._match_threshold()
+        if best_d2 < (threshold * threshold):
             return self.known_face_names[best_match_index]
         return "Unknown"
+
+    def get_names_batch(self, face_encodings):
+        """Match M encodings at once with a single GEMM; returns a list of M names."""
+        queries = np.ascontiguousarray(face_encodings, dtype=np.float32).reshape(-1, 128)
+        if queries.shape[0] == 0:
+            return []
+        if self.known_face_encodings.shape[0] == 0:
+            return ["Unknown"] * queries.shape[0]
+
+        if self._faiss_index is not None:
+            # faiss returns squared L2 distances, same as the GEMM path below
+            dist, idx = self._faiss_index.search(queries, 1)
+            best, best_d2 = idx[:, 0], dist[:, 0]
+            # IVF may return -1 when the probed lists are empty
+            best_d2 = np.where(best < 0, np.inf, best_d2)
+        elif self._known_q is not None:
+            # Coarse int8 GEMM (int32 accumulation) for all queries, then exact float32
+            # re-rank of each query's shortlist (see get_name).
+            q = self._quantize(queries)
+            dots_q = np.einsum('mj,ij->mi', q, self._known_q, dtype=np.int32)
+            d2_q = self._known_q_sq[None, :] - 2 * dots_q
+            k = min(self.QUANTIZE_CANDIDATES, d2_q.shape[1])
+            candidates = np.argpartition(d2_q, k - 1, axis=1)[:, :k]
+            cand_enc = self.known_face_encodings[candidates]  # M x k x 128
+            dots = np.einsum('mkd,md->mk', cand_enc, queries)
+            q_sq = np.einsum('ij,ij->i', queries, queries)
+            d2 = self._known_sq[candidates] + q_sq[:, None] - 2.0 * dots
+            pick = d2.argmin(axis=1)
+            rows = np.arange(queries.shape[0])
+            best, best_d2 = candidates[rows, pick], d2[rows, pick]
+        else:
+            q_sq = np.einsum('ij,ij->i', queries, queries)
+            cross = queries @ self.known_face_encodings.T
+            d2 = q_sq[:, None] + self._known_sq[None, :] - 2.0 * cross
+            best = d2.argmin(axis=1)
+            best_d2 = d2[np.arange(queries.shape[0]), best]
+
+        threshold = self._match_threshold()
+        matched = best_d2 < (threshold * threshold)
+        return [self.known_face_names[int(i)] if ok else "Unknown" for i, ok in zip(best, matched)]
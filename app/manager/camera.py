@@ -6,6 +6,65 @@ import queue
 import os
 import json
 
+from config.watch import watch_file
+
+
+class LatestFrameSlot:
+    """Single-slot handoff that only keeps the newest frame.
+
+    put() never blocks and simply overwrites the previous frame, so the producer
+    doesn't need any queue.Full handling. get() mirrors queue.Queue.get() and
+    raises queue.Empty on timeout. Every get() counts as consumer activity, see
+    last_consumed().
+    """
+    __slots__ = ('_cond', '_frame', '_consumed_ts')
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._frame = None
+        self._consumed_ts = 0.0
+
+    def mark_consumed(self):
+        self._consumed_ts = time.monotonic()
+
+    def last_consumed(self) -> float:
+        """Monotonic timestamp of the last reader activity (0.0 = never)."""
+        return self._consumed_ts
+
+    def put(self, frame, block=True, timeout=None):
+        with self._cond:
+            self._frame = frame
+            # Only one waiter can take the frame
+            self._cond.notify()
+
+    def put_nowait(self, frame):
+        self.put(frame)
+
+    def _has_frame(self) -> bool:
+        return self._frame is not None
+
+    def get(self, block=True, timeout=None):
+        self._consumed_ts = time.monotonic()
+        with self._cond:
+            # wait_for re-checks after every wakeup, so a reader that loses the race for a
+            # frame keeps waiting until its own deadline instead of raising queue.Empty early
+            if block and not self._cond.wait_for(self._has_frame, timeout):
+                raise queue.Empty
+            frame = self._frame
+            if frame is None:
+                raise queue.Empty
+            self._frame = None
+        return frame
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        return 0 if self._frame is None else 1
+
+    def empty(self) -> bool:
+        return self._frame is None
+
 
 class CameraManager(threading.Thread):
     def __init__(self, frame_queue, camera_url, output_size=(640, 480), max_retries=15, config_manager=None):
@@ -15,6 +74,7 @@ class CameraManager(threading.Thread):
         self.frame_queue = frame_queue
         self.capture = None
         self.running = True
+        self._stop_event = threading.Event()
         self.max_retries = max_retries
         self.config_manager = config_manager
         self.trigger_file = os.path.join("/data", "manual_trigger.json")
@@ -22,38 +82,95 @@ class CameraManager(threading.Thread):
         # Trigger-Übergang erkennen (OFF -> ON)
         self._last_trigger_active = False
 
-    def _stream_suspend_enabled(self) -> bool:
+        # Cached trigger payload: (triggered_at, duration), only re-read when st_mtime_ns changes.
+        # stat() runs at most every _trigger_stat_interval seconds.
+        self._trigger_cache = None
+        self._trigger_mtime_ns = -1
+        self._trigger_last_stat = 0.0
+        self._trigger_stat_interval = 0.2  # seconds
+        self._trigger_grace = 10.0
+        # With inotify, the trigger file is only stat()ed after it was written/replaced/removed.
+        self._trigger_dirty = True
+        self._trigger_watching = self._start_trigger_watcher()
+
+        # Adaptive drain: only pre-grab (discard) as many frames as piled up since the last read.
+        self._read_dt_ema = 0.0
+        self._last_read_ts = None
+        self._frame_period = 1.0 / 20
+        self._backend_drops = False
+        self.max_drain = 10
+
+    def _config_snapshot(self):
+        if not self.config_manager:
+            return {}
+        try:
+            return self.config_manager.get_snapshot()
+        except Exception:
+            return {}
+
+    @staticmethod
+    def _stream_suspend_enabled(cfg) -> bool:
         try:
-            return bool(self.config_manager and self.config_manager.get("enable_stream_suspend", False))
+            return bool(cfg.get("enable_stream_suspend", False))
         except Exception:
             return False
 
-    def _trigger_active(self) -> bool:
+    def _poll_trigger_file(self, cfg):
+        """stat() the trigger file and reload the cached payload + grace only if it changed."""
+        try:
+            st = os.stat(self.trigger_file)
+        except FileNotFoundError:
+            self._trigger_cache = None
+            self._trigger_mtime_ns = -1
+            return
+        except OSError as e:
+            logging.debug(f"Trigger stat failed: {e}")
+            self._trigger_cache = None
+            return
+
         try:
-            if not os.path.exists(self.trigger_file):
-                return False
+            grace = float(cfg.get("stream_suspend_grace_seconds", 10) or 0)
+        except Exception:
+            grace = 10.0
+        self._trigger_grace = max(0.0, min(grace, 600.0))
+
+        if st.st_mtime_ns == self._trigger_mtime_ns:
+            return
 
+        try:
             with open(self.trigger_file, "r") as f:
                 data = json.load(f)
-
-            now = time.time()
             triggered_at = float(data.get("timestamp", 0.0))
             duration = float(data.get("duration", 0.0))
             duration = max(0.0, min(duration, 120.0))
+            self._trigger_cache = (triggered_at, duration)
+            self._trigger_mtime_ns = st.st_mtime_ns
+        except Exception as e:
+            logging.debug(f"Trigger read failed: {e}")
+            self._trigger_cache = None
 
-            grace = 10.0
-            if self.config_manager:
-                try:
-                    grace = float(self.config_manager.get("stream_suspend_grace_seconds", 10) or 0)
-                except Exception:
-                    grace = 10.0
+    def _start_trigger_watcher(self) -> bool:
+        """Watch the trigger file via inotify; returns False if unavailable (poll fallback)."""
+        return watch_file(self.trigger_file, self._on_trigger_changed, on_stop=self._on_trigger_watch_stopped)
 
-            grace = max(0.0, min(grace, 600.0))
-            return now <= (triggered_at + duration + grace)
+    def _on_trigger_changed(self):
+        self._trigger_dirty = True
 
-        except Exception as e:
-            logging.debug(f"Trigger read failed: {e}")
+    def _on_trigger_watch_stopped(self):
+        self._trigger_watching = False
+
+    def _trigger_active(self, cfg) -> bool:
+        mono = time.monotonic()
+        if (mono - self._trigger_last_stat) >= self._trigger_stat_interval:
+            self._trigger_last_stat = mono
+            if not self._trigger_watching or self._trigger_dirty:
+                self._trigger_dirty = False
+                self._poll_trigger_file(cfg)
+
+        if self._trigger_cache is None:
             return False
+        triggered_at, duration = self._trigger_cache
+        return time.time() <= (triggered_at + duration + self._trigger_grace)
 
     def open_camera(self):
         if not self.camera_url:
@@ -62,29 +179,63 @@ class CameraManager(threading.Thread):
 
         attempt = 0
         while attempt < self.max_retries and not self.capture:
+            if self._stop_event.is_set():
+                raise RuntimeError("shutdown")
             self.capture = cv2.VideoCapture(self.camera_url)
             if self.capture.isOpened():
-                try:
-                    # Buffer klein halten → weniger Latenz (wirkt nicht bei allen Backends, schadet aber nicht)
-                    self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-                except Exception:
-                    pass
-
+                self._post_open()
                 logging.info("Camera connected successfully.")
                 return
 
             attempt += 1
-            logging.warning(f"Verbindungsversuch {attempt} fehlgeschlagen. Neuer Versuch in 2 Sekunden...")
+            # Exponentielles Backoff (0.25 -> 0.5 -> 1 -> 2 s), durch stop() sofort unterbrechbar
+            delay = min(2.0, 0.25 * (2 ** (attempt - 1)))
+            logging.warning(f"Verbindungsversuch {attempt} fehlgeschlagen. Neuer Versuch in {delay:.2f} Sekunden...")
             try:
                 self.capture.release()
             except Exception:
                 pass
             self.capture = None
-            time.sleep(2)
+            if self._stop_event.wait(delay):
+                raise RuntimeError("shutdown")
 
         logging.error("Kamera konnte nach mehreren Versuchen nicht geöffnet werden.")
         raise ValueError("Kamera konnte nicht geöffnet werden")
 
+    def _post_open(self):
+        """One-time capture setup after a successful open."""
+        try:
+            # Buffer klein halten → weniger Latenz (wirkt nicht bei allen Backends, schadet aber nicht)
+            self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            # Backend hält nur das neueste Frame -> kein Vorab-Grab nötig
+            self._backend_drops = self.capture.get(cv2.CAP_PROP_BUFFERSIZE) == 1
+            fps_hint = float(self.capture.get(cv2.CAP_PROP_FPS) or 0)
+        except Exception:
+            self._backend_drops = False
+            fps_hint = 0.0
+        self._frame_period = 1.0 / max(fps_hint, 20.0)
+        self._read_dt_ema = 0.0
+        self._last_read_ts = None
+
+    def _drain_count(self) -> int:
+        """Number of stale frames to discard before the next read, based on the read interval."""
+        if self._backend_drops:
+            return 0
+        n_skip = int(self._read_dt_ema / self._frame_period) - 1
+        return max(0, min(n_skip, self.max_drain))
+
+    def _update_read_interval(self):
+        now = time.monotonic()
+        if self._last_read_ts is not None:
+            dt = now - self._last_read_ts
+            self._read_dt_ema = dt if self._read_dt_ema <= 0.0 else (0.8 * self._read_dt_ema + 0.2 * dt)
+        self._last_read_ts = now
+
+    def _reconnect_after_failure(self, delay: float):
+        """Close the camera and wait `delay` seconds (returns early on stop())."""
+        self._close_camera()
+        self._stop_event.wait(delay)
+
     def _close_camera(self):
         if self.capture is not None:
             try:
@@ -92,18 +243,22 @@ class CameraManager(threading.Thread):
             except Exception:
                 pass
         self.capture = None
+        self._last_read_ts = None
 
     def run(self):
         while self.running:
             try:
-                trigger_now = self._trigger_active()
-                suspend_enabled = self._stream_suspend_enabled()
+                # Config einmal pro Durchlauf lesen
+                cfg = self._config_snapshot()
+                trigger_now = self._trigger_active(cfg)
+                suspend_enabled = self._stream_suspend_enabled(cfg)
 
                 # --------------------------------------------------
                 # SUSPEND: NICHT LESEN -> TCP Backpressure (RX runter)
                 # --------------------------------------------------
                 if suspend_enabled and not trigger_now:
-                    time.sleep(0.5)
+                    self._stop_event.wait(0.5)
+                    self._last_read_ts = None
                     self._last_trigger_active = trigger_now
                     continue
 
@@ -114,15 +269,11 @@ class CameraManager(threading.Thread):
                     try:
                         self.open_camera()
                         # Nach Reconnect alte Frames verwerfen
-                        try:
-                            for _ in range(10):
-                                self.capture.grab()
-                        except Exception:
-                            pass
+                        for _ in range(10):
+                            self.capture.grab()
                     except Exception as e:
                         logging.error(f"Camera open failed: {e}")
-                        self._close_camera()
-                        time.sleep(2)
+                        self._reconnect_after_failure(2.0)
                         self._last_trigger_active = trigger_now
                         continue
 
@@ -131,57 +282,53 @@ class CameraManager(threading.Thread):
                 # --------------------------------------------------
                 if trigger_now and not self._last_trigger_active:
                     t_end = time.monotonic() + 0.4
-                    try:
-                        while time.monotonic() < t_end:
-                            if not self.capture.grab():
-                                break
-                    except Exception:
-                        pass
+                    while time.monotonic() < t_end:
+                        if not self.capture.grab():
+                            break
 
                 # --------------------------------------------------
                 # Frame-Drop: immer möglichst neuestes Bild holen
+                # (so viele Frames verwerfen, wie seit dem letzten Lesen aufgelaufen sind)
                 # --------------------------------------------------
                 try:
-                    for _ in range(2):
+                    for _ in range(self._drain_count() + 1):
                         self.capture.grab()
                 except Exception:
                     logging.warning("Grab fehlgeschlagen, versuche reconnect...")
-                    self._close_camera()
-                    time.sleep(0.5)
+                    self._reconnect_after_failure(0.5)
                     self._last_trigger_active = trigger_now
                     continue
 
                 ret, frame = self.capture.retrieve()
                 if not ret or frame is None:
                     logging.warning("Kein Frame von Kamera erhalten (retrieve), versuche reconnect...")
-                    self._close_camera()
-                    time.sleep(0.5)
+                    self._reconnect_after_failure(0.5)
                     self._last_trigger_active = trigger_now
                     continue
 
-                resized_frame = cv2.resize(frame, self.output_size)
+                self._update_read_interval()
+
+                # Every read gets its own frame: the previous one may still be in use by the
+                # FrameProcessor or a stream client. retrieve() already returns a fresh array,
+                # so a frame that already has the output size is handed on as is.
+                if (frame.shape[1], frame.shape[0]) == tuple(self.output_size):
+                    resized_frame = frame
+                else:
+                    resized_frame = cv2.resize(frame, self.output_size)
 
                 # --------------------------------------------------
-                # Queue: immer nur neuestes Frame behalten
+                # Slot: immer nur neuestes Frame behalten (überschreibt das alte)
                 # --------------------------------------------------
-                while True:
-                    try:
-                        self.frame_queue.put(resized_frame, timeout=0.05)
-                        break
-                    except queue.Full:
-                        try:
-                            self.frame_queue.get_nowait()
-                            logging.debug("Frame queue voll – ältestes Frame verworfen.")
-                        except queue.Empty:
-                            pass
+                self.frame_queue.put(resized_frame)
 
                 self._last_trigger_active = trigger_now
 
             except Exception as e:
                 logging.error(f"Error in CameraManager loop: {e}")
-                time.sleep(0.5)
+                self._stop_event.wait(0.5)
 
         self._close_camera()
 
     def stop(self):
         self.running = False
+        self._stop_event.set()
@@ -1,11 +1,870 @@
 import threading
 import logging
 import cv2
+import numpy as np
 import face_recognition
 import queue
+import collections
+import functools
 import time
 import os
 import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import NamedTuple, Optional
+
+from config.watch import watch_file
+
+
+# Lazily compiled numba kernel: None = not tried yet, False = numba unavailable
+_lap_var_kernel = None
+
+
+def _get_lap_var_kernel():
+    """Return a fused Laplacian-variance kernel for uint8 gray images, or None without numba."""
+    global _lap_var_kernel
+    if _lap_var_kernel is None:
+        try:
+            from numba import njit, prange
+        except ImportError:
+            _lap_var_kernel = False
+            return None
+
+        @njit(parallel=True, fastmath=True, cache=True)
+        def _lap_var(gray):
+            h, w = gray.shape
+            if h < 3 or w < 3:
+                return 0.0
+            total = 0
+            total_sq = 0
+            for y in prange(1, h - 1):
+                row_sum = 0
+                row_sq = 0
+                for x in range(1, w - 1):
+                    lap = (4 * np.int32(gray[y, x]) - np.int32(gray[y - 1, x]) - np.int32(gray[y + 1, x])
+                           - np.int32(gray[y, x - 1]) - np.int32(gray[y, x + 1]))
+                    row_sum += lap
+                    row_sq += lap * lap
+                total += row_sum
+                total_sq += row_sq
+            n = (h - 2) * (w - 2)
+            mean = total / n
+            return total_sq / n - mean * mean
+
+        _lap_var_kernel = _lap_var
+    return _lap_var_kernel or None
+
+
+# Set once the hog fallback for model='scrfd' has been logged in this process
+_scrfd_fallback_warned = False
+
+
+def _warn_scrfd_fallback():
+    """Warn once per process that face_detection_model='scrfd' runs as hog."""
+    global _scrfd_fallback_warned
+    if not _scrfd_fallback_warned:
+        _scrfd_fallback_warned = True
+        logging.warning("face_detection_model 'scrfd' needs insightface + onnxruntime "
+                        "(and the buffalo_s model pack); falling back to hog")
+
+
+class FaceRecognitionBackend:
+    """Face detection + encoding based on face_recognition (dlib).
+
+    FrameProcessor only talks to detect()/encode(), so another backend can be
+    plugged in as long as it yields encodings compatible with the known faces
+    (128-D dlib descriptors, see FaceLoader). model='scrfd' swaps only the detector
+    for InsightFace's SCRFD (if insightface is installed); encodings stay dlib.
+    """
+
+    # InsightFace model pack whose SCRFD detector serves model='scrfd'
+    SCRFD_MODEL_PACK = 'buffalo_s'
+    SCRFD_DET_SIZE = (640, 640)
+
+    def __init__(self):
+        # None = not tried yet, False = batched dlib path unavailable
+        self._batch_encoder = None
+        # None = not tried yet, False = insightface/onnxruntime unavailable
+        self._scrfd = None
+
+    def detect(self, rgb_image, upsample=1, model='hog'):
+        """Return face boxes as (top, right, bottom, left) tuples."""
+        if model == 'scrfd':
+            detector = self._get_scrfd()
+            if detector is not None:
+                return self._detect_scrfd(detector, rgb_image)
+            _warn_scrfd_fallback()
+            model = 'hog'
+        return face_recognition.face_locations(
+            rgb_image,
+            number_of_times_to_upsample=upsample,
+            model=model
+        )
+
+    def _get_scrfd(self):
+        """Lazily load the SCRFD detector of the InsightFace model pack (ONNX Runtime)."""
+        if self._scrfd is None:
+            try:
+                from insightface.app import FaceAnalysis
+                app = FaceAnalysis(name=self.SCRFD_MODEL_PACK, allowed_modules=['detection'],
+                                   providers=['CUDAExecutionProvider', 'CPUExecutionProvider'])
+                app.prepare(ctx_id=0, det_size=self.SCRFD_DET_SIZE)
+                self._scrfd = app.det_model
+            except Exception as e:
+                logging.debug(f"SCRFD detector unavailable: {e}")
+                self._scrfd = False
+        return self._scrfd or None
+
+    @staticmethod
+    def _detect_scrfd(detector, rgb_image):
+        # InsightFace models expect BGR input
+        bgr = np.ascontiguousarray(rgb_image[:, :, ::-1])
+        bboxes, _ = detector.detect(bgr, max_num=0, metric='default')
+        if bboxes is None or len(bboxes) == 0:
+            return []
+        h, w = rgb_image.shape[:2]
+        # (x1, y1, x2, y2, score) -> (top, right, bottom, left), clipped to the image
+        boxes = np.rint(bboxes[:, :4]).astype(np.int32)
+        left = np.clip(boxes[:, 0], 0, w - 1)
+        top = np.clip(boxes[:, 1], 0, h - 1)
+        right = np.clip(boxes[:, 2], 0, w - 1)
+        bottom = np.clip(boxes[:, 3], 0, h - 1)
+        return [tuple(b) for b in np.stack((top, right, bottom, left), axis=1).tolist()]
+
+    @staticmethod
+    def cuda_enabled() -> bool:
+        """True if dlib was built with CUDA (batched CNN detection pays off only there)."""
+        try:
+            import dlib
+            return bool(getattr(dlib, 'DLIB_USE_CUDA', False))
+        except Exception:
+            return False
+
+    def detect_batch(self, rgb_images, upsample=1):
+        """CNN detection for several equally sized images in one call; one list of boxes per image."""
+        return face_recognition.batch_face_locations(
+            rgb_images,
+            number_of_times_to_upsample=upsample,
+            batch_size=len(rgb_images)
+        )
+
+    def warm_up(self, model='hog'):
+        """Run detection + encoding once on a black dummy image.
+
+        The first real call otherwise pays one-off costs (CUDA/cuDNN context and kernel
+        setup for cnn, SCRFD/ONNX session creation, dlib allocations) on a live frame.
+        """
+        dummy = np.zeros((64, 64, 3), dtype=np.uint8)
+        try:
+            self.detect(dummy, upsample=0, model=model)
+            self.encode(dummy, [(0, 64, 64, 0)])
+        except Exception as e:
+            logging.debug(f"Face model warm-up failed: {e}")
+
+    def _get_batch_encoder(self):
+        if self._batch_encoder is None:
+            try:
+                import dlib
+                from face_recognition import api as fr_api
+                # Same models face_recognition loads; only the call pattern differs.
+                # Everything is looked up once here, so a missing attribute disables the
+                # batched path up front instead of failing on every call.
+                self._batch_encoder = (
+                    dlib.full_object_detections,
+                    fr_api.pose_predictor_5_point,
+                    fr_api._css_to_rect,
+                    fr_api.face_encoder.compute_face_descriptor,
+                )
+            except Exception as e:
+                logging.debug(f"Batched face encoding unavailable, using face_recognition: {e}")
+                self._batch_encoder = False
+        return self._batch_encoder or None
+
+    def encode(self, rgb_image, face_locations):
+        """Return one encoding per face location.
+
+        All faces of the frame go through a single dlib compute_face_descriptor()
+        call (one C++ round-trip instead of one per face).
+        """
+        if not face_locations:
+            return []
+        encoder = self._get_batch_encoder()
+        if encoder is not None:
+            detections_cls, predict_shape, css_to_rect, compute_descriptors = encoder
+            try:
+                shapes = detections_cls()
+                for loc in face_locations:
+                    shapes.append(predict_shape(rgb_image, css_to_rect(loc)))
+                descriptors = compute_descriptors(rgb_image, shapes, 1)
+                return [np.array(d) for d in descriptors]
+            except Exception as e:
+                # Per-call fallback: a bad location must not disable the batched path for
+                # good (that only happens when the dlib import/lookup in _get_batch_encoder fails)
+                logging.debug(f"Batched face encoding failed, using face_recognition for this call: {e}")
+        return face_recognition.face_encodings(rgb_image, face_locations)
+
+    def encode_batch(self, rgb_images, locations_per_image):
+        """encode() for several images; one compute_face_descriptor() call covers all of them."""
+        encoder = self._get_batch_encoder()
+        if encoder is not None and any(locations_per_image):
+            detections_cls, predict_shape, css_to_rect, compute_descriptors = encoder
+            try:
+                batch_shapes = []
+                for rgb_image, face_locations in zip(rgb_images, locations_per_image):
+                    shapes = detections_cls()
+                    for loc in face_locations:
+                        shapes.append(predict_shape(rgb_image, css_to_rect(loc)))
+                    batch_shapes.append(shapes)
+                batch = compute_descriptors(list(rgb_images), batch_shapes, 1)
+                return [[np.array(d) for d in descriptors] for descriptors in batch]
+            except Exception as e:
+                logging.debug(f"Multi-image face encoding unavailable, encoding per image: {e}")
+        return [self.encode(rgb_image, face_locations)
+                for rgb_image, face_locations in zip(rgb_images, locations_per_image)]
+
+
+class DetectionSettings(NamedTuple):
+    """Pre-coerced config values for the detection hot path (rebuilt ~1x/sec)."""
+    scale_factor: float = 0.75
+    scale_multiplier: float = 1.0 / 0.75
+    blur_threshold: Optional[float] = None  # None = blur filter disabled
+    enable_clahe: bool = False
+    enable_cuda_preproc: bool = False
+    enable_opencl: bool = False
+    model: str = 'hog'
+    upsample: int = 1
+    enable_face_overlay: bool = True
+    detection_batch: int = 1
+    tracker_scale: float = 1.0
+
+    # Side length (px) of dlib's HOG face detection window, the smallest face it finds
+    HOG_WINDOW = 80
+
+    @classmethod
+    def from_config(cls, cfg):
+        cfg = cfg or {}
+        try:
+            scale_factor = float(cfg.get('face_scale_factor', 0.75))
+        except Exception:
+            scale_factor = 0.75
+        # Clamp to reasonable range
+        scale_factor = max(0.25, min(scale_factor, 1.0))
+
+        # Optional blur filter: skip recognition on very blurry frames
+        blur_threshold = None
+        if cfg.get('enable_blur_filter', False):
+            try:
+                blur_threshold = float(cfg.get('blur_threshold', 100.0))
+            except Exception:
+                blur_threshold = 100.0
+
+        model = str(cfg.get('face_detection_model', 'hog')).lower().strip()
+        if model not in ('hog', 'cnn', 'scrfd'):
+            model = 'hog'
+
+        # Upsampling helps detect smaller faces (at the cost of CPU).
+        # 0 = no upsample, 1–2 = common, 3 = heavy.
+        try:
+            upsample = int(cfg.get('face_upsample_times', 1))
+        except Exception:
+            upsample = 1
+        upsample = max(0, min(upsample, 3))
+
+        # With a known smallest face size, HOG runs on the smallest pyramid level (1, 1/2, 1/4)
+        # where such a face still fills dlib's detection window, without upsampling.
+        try:
+            min_face_size = float(cfg.get('min_face_size', 0) or 0)
+        except Exception:
+            min_face_size = 0.0
+        if model == 'hog' and min_face_size >= cls.HOG_WINDOW:
+            level = 0
+            while level < 2 and min_face_size / (2 ** (level + 1)) >= cls.HOG_WINDOW:
+                level += 1
+            scale_factor = 1.0 / (2 ** level)
+            upsample = 0
+        # At half resolution or less, upsampling would just rebuild the pyramid levels we
+        # removed by downscaling; dlib's per-level HOG cost dominates, so skip it.
+        if cfg.get('auto_upsample', True) and scale_factor <= 0.5:
+            upsample = 0
+
+        # Trackers run on a frame downscaled by this factor (0.5 = quarter of the pixels)
+        try:
+            tracker_scale = max(0.25, min(float(cfg.get('tracker_scale', 1.0)), 1.0))
+        except Exception:
+            tracker_scale = 1.0
+
+        # Frames per batched CNN detection call (only used with CUDA-enabled dlib)
+        try:
+            detection_batch = max(1, min(int(cfg.get('detection_batch', 1)), 16))
+        except Exception:
+            detection_batch = 1
+
+        return cls(
+            scale_factor=scale_factor,
+            # IMPORTANT: scale_factor is typically not a clean divisor (e.g. 0.75).
+            # Using int(1/scale_factor) truncates (1/0.75 -> 1) and breaks the rescaling.
+            scale_multiplier=1.0 / scale_factor,
+            blur_threshold=blur_threshold,
+            enable_clahe=bool(cfg.get('enable_clahe', False)),
+            enable_cuda_preproc=bool(cfg.get('enable_cuda_preproc', False)),
+            enable_opencl=bool(cfg.get('enable_opencl', False)),
+            model=model,
+            upsample=upsample,
+            enable_face_overlay=bool(cfg.get('enable_face_overlay', True)),
+            detection_batch=detection_batch,
+            tracker_scale=tracker_scale,
+        )
+
+
+@functools.lru_cache(maxsize=128)
+def _render_name_sprite(name, font_scale, thickness):
+    """Rasterize a name label (white on black = glyph coverage) once; returns (sprite, pad, ascent).
+
+    The sprite's text baseline origin sits at (pad, ascent + pad), so it is blitted
+    with its top-left at (x - pad, y - ascent - pad) for a putText() origin (x, y).
+    """
+    (tw, th), baseline = cv2.getTextSize(name, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+    pad = thickness
+    sprite = np.zeros((th + baseline + 2 * pad, tw + 2 * pad, 3), dtype=np.uint8)
+    cv2.putText(sprite, name, (pad, th + pad), cv2.FONT_HERSHEY_SIMPLEX,
+                font_scale, (255, 255, 255), thickness)
+    sprite.setflags(write=False)
+    return sprite, pad, th
+
+
+def _scale_locations(face_locations, multiplier):
+    """(top, right, bottom, left) boxes from the small detection frame -> int32 Nx4 at full scale."""
+    if float(multiplier).is_integer():
+        # Clean divisors (e.g. scale_factor 0.5 -> 2) need no float round trip
+        return np.asarray(face_locations, dtype=np.int32).reshape(-1, 4) * int(multiplier)
+    locs = np.asarray(face_locations, dtype=np.float32).reshape(-1, 4) * multiplier
+    return np.rint(locs).astype(np.int32)
+
+
+def _locations_to_xywh(locs):
+    """Nx4 (top, right, bottom, left) -> Nx4 (x, y, w, h), the tracker box layout."""
+    top, right, bottom, left = locs[:, 0], locs[:, 1], locs[:, 2], locs[:, 3]
+    return np.stack((left, top, right - left, bottom - top), axis=1)
+
+
+def _iou_matrix(a, b):
+    """Pairwise intersection over union of Nx4 and Mx4 (x, y, w, h) boxes -> NxM."""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    ax1, ay1 = a[:, 0:1], a[:, 1:2]
+    ax2, ay2 = ax1 + a[:, 2:3], ay1 + a[:, 3:4]
+    bx1, by1 = b[:, 0], b[:, 1]
+    bx2, by2 = bx1 + b[:, 2], by1 + b[:, 3]
+    iw = np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0.0, None)
+    ih = np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0.0, None)
+    inter = iw * ih
+    union = (a[:, 2:3] * a[:, 3:4]) + (b[:, 2] * b[:, 3]) - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+class FaceDetector:
+    """Preprocessing + face detection + encoding, with the state they reuse across frames
+    (resize/RGB buffers, CLAHE, GPU handles).
+
+    Runs on the detector thread and must not touch tracker or trigger state.
+    """
+
+    # A detection reuses a tracked face's name (skipping its encoding) above this overlap;
+    # stricter than tracker continuity (0.5) since a wrong reuse mislabels a person
+    NAME_REUSE_MIN_IOU = 0.6
+
+    def __init__(self, face_backend=None):
+        self.face_backend = face_backend or FaceRecognitionBackend()
+        # Lazily created CLAHE instance (reused across frames)
+        self._clahe = None
+        # Reused detection buffers (downscaled BGR + contiguous RGB)
+        self._small_buf = None
+        self._rgb_buf = None
+        # Optional CUDA preprocessing (only with a CUDA-enabled OpenCV build)
+        self._cuda_available = self._detect_cuda()
+        self._gpu_frame = None
+        self._gpu_clahe = None
+        # Optional OpenCL (T-API / cv2.UMat) preprocessing, e.g. on an integrated GPU.
+        # None = not probed yet: the runtime is only loaded (and the process-global
+        # setUseOpenCL switched on) once enable_opencl is actually set.
+        self._opencl_available = None
+        self._dlib_cuda = None  # resolved lazily, see batch_detection_enabled()
+
+    @staticmethod
+    def _reuse_buffer(buf, shape, dtype=np.uint8):
+        """Return buf if it matches shape, else a freshly allocated one."""
+        if buf is None or buf.shape != tuple(shape) or buf.dtype != dtype:
+            return np.empty(shape, dtype=dtype)
+        return buf
+
+    @staticmethod
+    def _detect_cuda() -> bool:
+        try:
+            return cv2.cuda.getCudaEnabledDeviceCount() > 0
+        except Exception:
+            return False
+
+    def _opencl_ready(self) -> bool:
+        if self._opencl_available is None:
+            self._opencl_available = self._detect_opencl()
+        return self._opencl_available
+
+    @staticmethod
+    def _detect_opencl() -> bool:
+        try:
+            if not cv2.ocl.haveOpenCL():
+                return False
+            cv2.ocl.setUseOpenCL(True)
+            return cv2.ocl.useOpenCL()
+        except Exception:
+            return False
+
+    def _ocl_preprocess(self, frame, small_size, use_clahe, blur_threshold=None, interp=cv2.INTER_LINEAR):
+        """Resize (+ CLAHE) + BGR->RGB through OpenCL UMats; only the small RGB result is downloaded.
+
+        Returns None if the frame is too blurry (blur_threshold given), else the RGB image.
+        """
+        usmall = cv2.resize(cv2.UMat(frame), small_size, interpolation=interp)
+
+        if blur_threshold is not None:
+            # Blur check needs the un-enhanced image (same order as the CPU path)
+            gray = cv2.cvtColor(usmall, cv2.COLOR_BGR2GRAY)
+            _, stddev = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_32F))
+            if float(stddev[0][0]) ** 2 < blur_threshold:
+                return None
+
+        if use_clahe:
+            if self._clahe is None:
+                self._clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+            channels = list(cv2.split(cv2.cvtColor(usmall, cv2.COLOR_BGR2YCrCb)))
+            channels[0] = self._clahe.apply(channels[0])
+            urgb = cv2.cvtColor(cv2.merge(channels), cv2.COLOR_YCrCb2RGB)
+        else:
+            urgb = cv2.cvtColor(usmall, cv2.COLOR_BGR2RGB)
+        # dlib needs a contiguous numpy array
+        return urgb.get()
+
+    def _gpu_preprocess(self, frame, small_size, use_clahe, blur_threshold=None, interp=cv2.INTER_LINEAR):
+        """Resize (+ CLAHE) + BGR->RGB on the GPU; only the small RGB result is downloaded.
+
+        Returns None if the frame is too blurry (blur_threshold given), else the RGB image.
+        """
+        if self._gpu_frame is None:
+            self._gpu_frame = cv2.cuda_GpuMat()
+        self._gpu_frame.upload(frame)
+        gpu_small = cv2.cuda.resize(self._gpu_frame, small_size, interpolation=interp)
+
+        if blur_threshold is not None:
+            # Blur check needs the un-enhanced image (same order as the CPU path)
+            if self._blur_score(gpu_small.download()) < blur_threshold:
+                return None
+
+        if use_clahe:
+            if self._gpu_clahe is None:
+                self._gpu_clahe = cv2.cuda.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+            ycrcb = cv2.cuda.cvtColor(gpu_small, cv2.COLOR_BGR2YCrCb)
+            channels = cv2.cuda.split(ycrcb)
+            channels[0] = self._gpu_clahe.apply(channels[0], cv2.cuda_Stream.Null())
+            ycrcb = cv2.cuda.merge(channels)
+            gpu_rgb = cv2.cuda.cvtColor(ycrcb, cv2.COLOR_YCrCb2RGB)
+        else:
+            gpu_rgb = cv2.cuda.cvtColor(gpu_small, cv2.COLOR_BGR2RGB)
+        # Download into the reused contiguous RGB buffer (same one the CPU path fills)
+        self._rgb_buf = self._reuse_buffer(self._rgb_buf, (small_size[1], small_size[0], 3))
+        return gpu_rgb.download(self._rgb_buf)
+
+    def _apply_clahe(self, frame_bgr):
+        """Optional contrast enhancement for low-light scenes."""
+        try:
+            if self._clahe is None:
+                self._clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+            ycrcb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2YCrCb)
+            # Equalize only the luma channel in place (no split/merge copies of Cr/Cb)
+            ycrcb[:, :, 0] = self._clahe.apply(ycrcb[:, :, 0])
+            return cv2.cvtColor(ycrcb, cv2.COLOR_YCrCb2BGR)
+        except Exception:
+            return frame_bgr
+
+    def _blur_score(self, frame_bgr):
+        """Higher means sharper."""
+        try:
+            gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
+            kernel = _get_lap_var_kernel()
+            if kernel is not None:
+                # Single fused pass over the uint8 image (no CV_64F Laplacian temporary)
+                return float(kernel(gray))
+            return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        except Exception:
+            return 0.0
+
+    def _reused_names(self, face_locations, scale_multiplier, name_hints):
+        """Per detection: the name of a hinted tracker box it overlaps (IoU > NAME_REUSE_MIN_IOU), else None."""
+        reused = [None] * len(face_locations)
+        if not name_hints or not face_locations:
+            return reused
+        boxes = _locations_to_xywh(_scale_locations(face_locations, scale_multiplier))
+        iou = _iou_matrix(boxes, [hint_bbox for hint_bbox, _ in name_hints])
+        best = iou.argmax(axis=1)
+        for i, j in enumerate(best.tolist()):
+            if iou[i, j] > self.NAME_REUSE_MIN_IOU:
+                reused[i] = name_hints[j][1]
+        return reused
+
+    def detect_faces(self, frame, settings, name_hints=()):
+        """Preprocess + detect + encode.
+
+        Returns (locations, encodings, scale_multiplier, reused_names) or None. Faces that
+        overlap a known tracked face (name_hints) are not encoded; reused_names holds that
+        name for them (None = encoded, see encodings).
+        """
+        try:
+            rgb_small_frame = self._preprocess(frame, settings)
+        except Exception as e:
+            logging.exception(f"Face detection preprocessing failed: {e}")
+            return None
+        if rgb_small_frame is None:
+            return None
+        return self.detect_preprocessed(rgb_small_frame, settings, name_hints)
+
+    def detect_preprocessed(self, rgb_small_frame, settings, name_hints=()):
+        """detect_faces() for an image that already went through _preprocess()."""
+        try:
+            # Detect faces
+            face_locations = self.face_backend.detect(rgb_small_frame, upsample=settings.upsample,
+                                                      model=settings.model)
+            return self._encode_faces(rgb_small_frame, face_locations, settings, name_hints)
+        except Exception as e:
+            logging.exception(f"Face detection/encoding failed: {e}")
+            return None
+
+    def batch_detection_enabled(self, settings) -> bool:
+        if settings.detection_batch <= 1 or settings.model != 'cnn':
+            return False
+        if self._dlib_cuda is None:
+            self._dlib_cuda = self.face_backend.cuda_enabled()
+        return self._dlib_cuda
+
+    def detect_faces_batch(self, jobs):
+        """detect_faces() for several (frame, settings, name_hints) jobs with one CNN detection call.
+
+        Returns a list of (frame, detection) pairs; detection may be None (blurry / failed).
+        """
+        prepared = []
+        for frame, settings, name_hints in jobs:
+            try:
+                rgb = self._preprocess(frame, settings)
+            except Exception as e:
+                logging.exception(f"Face preprocessing failed: {e}")
+                rgb = None
+            if rgb is not None:
+                # The preprocess buffers are reused per frame; the batch needs its own copies
+                prepared.append((frame, settings, name_hints, rgb.copy()))
+        if not prepared:
+            return []
+
+        settings = prepared[0][1]
+        if any(p[3].shape != prepared[0][3].shape for p in prepared):
+            # Resolution changed mid-batch: dlib batches need equally sized images
+            return [(frame, self.detect_faces(frame, s, hints)) for frame, s, hints, _ in prepared]
+        try:
+            rgbs = [p[3] for p in prepared]
+            batch_locations = self.face_backend.detect_batch(rgbs, upsample=settings.upsample)
+            reused_per_frame = [self._reused_names(locations, s.scale_multiplier, hints)
+                                for (_, s, hints, _), locations in zip(prepared, batch_locations)]
+            to_encode = [[loc for loc, reused in zip(locations, reused_names) if reused is None]
+                         for locations, reused_names in zip(batch_locations, reused_per_frame)]
+            # All faces of all frames in one descriptor call
+            encodings = self.face_backend.encode_batch(rgbs, to_encode)
+            return [(frame, (locations, encs, s.scale_multiplier, reused_names))
+                    for (frame, s, _, _), locations, encs, reused_names
+                    in zip(prepared, batch_locations, encodings, reused_per_frame)]
+        except Exception as e:
+            logging.exception(f"Batched face detection/encoding failed: {e}")
+            return []
+
+    def _preprocess(self, frame, settings):
+        """Downscale (+ blur check, CLAHE) + BGR->RGB. Returns the RGB image, or None if too blurry."""
+        scale_factor = settings.scale_factor
+        h, w = frame.shape[:2]
+        small_size = (max(1, int(round(w * scale_factor))), max(1, int(round(h * scale_factor))))
+        # INTER_AREA is the anti-aliased choice for shrinking
+        interp = cv2.INTER_AREA if scale_factor < 1.0 else cv2.INTER_LINEAR
+
+        blur_threshold = settings.blur_threshold
+
+        rgb_small_frame = None
+        if self._cuda_available and settings.enable_cuda_preproc:
+            try:
+                rgb_small_frame = self._gpu_preprocess(frame, small_size, settings.enable_clahe,
+                                                       blur_threshold, interp)
+                if rgb_small_frame is None:
+                    # Too blurry: no detection this round
+                    return None
+            except cv2.error as e:
+                logging.warning(f"CUDA preprocessing failed, using CPU path: {e}")
+                self._cuda_available = False
+                rgb_small_frame = None
+
+        if rgb_small_frame is None and settings.enable_opencl and self._opencl_ready():
+            try:
+                rgb_small_frame = self._ocl_preprocess(frame, small_size, settings.enable_clahe,
+                                                       blur_threshold, interp)
+                if rgb_small_frame is None:
+                    # Too blurry: no detection this round
+                    return None
+            except cv2.error as e:
+                logging.warning(f"OpenCL preprocessing failed, using CPU path: {e}")
+                self._opencl_available = False
+                rgb_small_frame = None
+
+        if rgb_small_frame is None:
+            self._small_buf = self._reuse_buffer(self._small_buf, (small_size[1], small_size[0]) + frame.shape[2:])
+            small_frame = cv2.resize(frame, small_size, dst=self._small_buf, interpolation=interp)
+
+            if blur_threshold is not None:
+                score = self._blur_score(small_frame)
+                if score < blur_threshold:
+                    # Too blurry: no detection this round
+                    return None
+
+            # Optional low-light enhancement
+            if settings.enable_clahe:
+                small_frame = self._apply_clahe(small_frame)
+
+            # Convert small frame to RGB from BGR, which OpenCV uses.
+            # cvtColor into a reused contiguous buffer (a [:, :, ::-1] view would be copied by dlib anyway).
+            self._rgb_buf = self._reuse_buffer(self._rgb_buf, small_frame.shape)
+            rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB, dst=self._rgb_buf)
+        return rgb_small_frame
+
+    def _encode_faces(self, rgb_small_frame, face_locations, settings, name_hints):
+        # Skip the ResNet forward pass for faces we are already tracking (name hints)
+        reused_names = self._reused_names(face_locations, settings.scale_multiplier, name_hints)
+        to_encode = [loc for loc, reused in zip(face_locations, reused_names) if reused is None]
+        face_encodings = self.face_backend.encode(rgb_small_frame, to_encode)
+        return face_locations, face_encodings, settings.scale_multiplier, reused_names
+
+
+# Per-process detector for DetectorWorker's optional process pool
+_pool_detector = None
+
+
+def _init_pool_detector(warm_up=None):
+    global _pool_detector
+    _pool_detector = FaceDetector()
+    if warm_up is not None:
+        _pool_detector.face_backend.warm_up(warm_up.model)
+
+
+def _pool_detect(frame, settings, name_hints):
+    return _pool_detector.detect_faces(frame, settings, name_hints)
+
+
+class _DropOldestQueue:
+    """Bounded FIFO whose put_nowait() evicts the oldest entry instead of raising queue.Full.
+
+    A deque(maxlen) behind one Condition: a single lock round-trip per operation
+    (queue.Queue juggles a mutex and three conditions). get()/get_nowait() mirror
+    queue.Queue and raise queue.Empty.
+    """
+    __slots__ = ('_items', '_cond')
+
+    def __init__(self, maxsize=2):
+        self._items = collections.deque(maxlen=max(1, maxsize))
+        self._cond = threading.Condition(threading.Lock())
+
+    def put_nowait(self, item):
+        with self._cond:
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._items and not self._cond.wait_for(lambda: self._items, timeout):
+                raise queue.Empty
+            return self._items.popleft()
+
+    def get_nowait(self):
+        with self._cond:
+            if not self._items:
+                raise queue.Empty
+            return self._items.popleft()
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+
+class DetectorWorker(threading.Thread):
+    """Runs preprocessing, face detection and encoding off the post-processing thread.
+
+    Consumes (frame, settings, name_hints) jobs and produces (frame, face_locations,
+    face_encodings, scale_multiplier, reused_names) results; both queues are bounded and
+    drop the oldest entry.
+
+    With processes > 0, jobs are detected in a pool of worker processes (each with its own
+    FaceDetector), so dlib runs on several cores despite the GIL. Results that finish after
+    a newer job's result are dropped.
+
+    With pipeline=True (in-thread detection only), a second thread preprocesses the next
+    frame while dlib (which releases the GIL) works on the current one. Two sets of
+    preprocessing buffers alternate; batched CNN detection is not used in this mode.
+    """
+
+    def __init__(self, detector, maxsize=2, processes=0, pipeline=False):
+        super().__init__(daemon=True, name='face-detector')
+        self.detector = detector
+        self.in_queue = _DropOldestQueue(maxsize)
+        self.out_queue = _DropOldestQueue(maxsize)
+        self.running = True
+        self.processes = processes
+        self._pool = None
+        self._slots = None
+        self._seq = 0
+        self._last_seq = 0
+        self.pipeline = pipeline and processes == 0
+        # Settings to warm the face models with before the first job (see start())
+        self._warm_up = None
+        # Preprocessed (frame, settings, name_hints, rgb) jobs; _prep_free counts the
+        # preprocessing buffers not held by a queued or in-progress detection
+        self._prepared = queue.Queue()
+        self._prep_free = threading.Semaphore(2)
+
+    def _run_prep(self):
+        # The worker's own detector covers one buffer set, a second instance the other
+        detectors = (self.detector, FaceDetector(face_backend=self.detector.face_backend))
+        turn = 0
+        while self.running:
+            if not self._prep_free.acquire(timeout=0.5):
+                continue
+            try:
+                frame, settings, name_hints = self.in_queue.get(timeout=0.5)
+                rgb_small_frame = detectors[turn]._preprocess(frame, settings)
+            except queue.Empty:
+                self._prep_free.release()
+                continue
+            except Exception as e:
+                logging.exception(f"Face detection preprocessing failed: {e}")
+                self._prep_free.release()
+                continue
+            if rgb_small_frame is None:
+                # Too blurry: the buffer is free again
+                self._prep_free.release()
+                continue
+            # Detections consume jobs in order, so the buffers are released in turn order
+            turn ^= 1
+            self._prepared.put((frame, settings, name_hints, rgb_small_frame))
+
+    def _run_pipelined(self):
+        threading.Thread(target=self._run_prep, daemon=True, name='face-preprocess').start()
+        while self.running:
+            try:
+                frame, settings, name_hints, rgb_small_frame = self._prepared.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                detection = self.detector.detect_preprocessed(rgb_small_frame, settings, name_hints)
+            finally:
+                self._prep_free.release()
+            if detection is not None:
+                self.out_queue.put_nowait((frame,) + detection)
+
+    def _start_pool(self):
+        try:
+            # spawn: forking a process that already runs camera/HTTP threads is not safe
+            self._pool = ProcessPoolExecutor(max_workers=self.processes,
+                                             mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_init_pool_detector,
+                                             initargs=(self._warm_up,))
+            self._slots = threading.BoundedSemaphore(self.processes)
+            logging.info(f"Face detection runs in {self.processes} worker processes")
+        except Exception as e:
+            logging.warning(f"Detector process pool unavailable, detecting in-thread: {e}")
+            self._pool = None
+            self.processes = 0
+
+    def _submit_to_pool(self, job):
+        self._seq += 1
+        seq, frame = self._seq, job[0]
+
+        def done(future):
+            self._slots.release()
+            try:
+                detection = future.result()
+            except BrokenProcessPool as e:
+                logging.error(f"Detector worker process died, detecting in-thread from now on: {e}")
+                self.processes = 0
+                return
+            except Exception as e:
+                logging.exception(f"Face detection in worker process failed: {e}")
+                return
+            # Callbacks run serially on the pool's management thread
+            if detection is not None and seq > self._last_seq:
+                self._last_seq = seq
+                self.out_queue.put_nowait((frame,) + detection)
+
+        self._pool.submit(_pool_detect, *job).add_done_callback(done)
+
+    def submit(self, frame, settings, name_hints=()):
+        self.in_queue.put_nowait((frame, settings, name_hints))
+
+    def start(self, warm_up=None):
+        """Start the thread; with warm_up (DetectionSettings) the models are warmed first."""
+        self._warm_up = warm_up
+        super().start()
+
+    def run(self):
+        if self._warm_up is not None and self.processes == 0:
+            self.detector.face_backend.warm_up(self._warm_up.model)
+        if self.pipeline:
+            self._run_pipelined()
+            return
+        if self.processes > 0:
+            self._start_pool()
+        while self.running:
+            use_pool = self.processes > 0 and self._pool is not None
+            # At most one in-flight job per worker process
+            if use_pool and not self._slots.acquire(timeout=0.5):
+                continue
+            try:
+                job = self.in_queue.get(timeout=0.5)
+            except queue.Empty:
+                if use_pool:
+                    self._slots.release()
+                continue
+            if use_pool:
+                try:
+                    self._submit_to_pool(job)
+                    continue
+                except Exception as e:
+                    logging.error(f"Detector process pool failed, detecting in-thread from now on: {e}")
+                    self._slots.release()
+                    self.processes = 0
+            jobs = [job]
+            batch = job[1].detection_batch if self.detector.batch_detection_enabled(job[1]) else 1
+            # Batch only what is already waiting: never hold a frame back to fill the batch
+            while len(jobs) < batch:
+                try:
+                    jobs.append(self.in_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if len(jobs) == 1:
+                    frame, settings, name_hints = job
+                    results = [(frame, self.detector.detect_faces(frame, settings, name_hints))]
+                else:
+                    results = self.detector.detect_faces_batch(jobs)
+            except Exception as e:
+                logging.exception(f"Unhandled exception in face detector thread: {e}")
+                continue
+            for frame, detection in results:
+                if detection is not None:
+                    self.out_queue.put_nowait((frame,) + detection)
+
+    def stop(self):
+        self.running = False
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
 
 
 class FrameProcessor(threading.Thread):
@@ -19,14 +878,50 @@ class FrameProcessor(threading.Thread):
         self.overlay_color = config_manager.get('overlay_color')
         self.enable_face_recognition_interval = config_manager.get('enable_face_recognition_interval', True)
         self.face_recognition_interval = config_manager.get('face_recognition_interval')
+        self._update_overlay_style()
         self.face_loader = face_loader
+        # Preprocessing/detection/encoding state, used by the detector thread
+        self.detector = FaceDetector()
+        self.face_backend = self.detector.face_backend
+        # Reused downscaled frames for the trackers, keyed by tracker_scale
+        self._track_bufs = {}
+        # Cached solid overlay color buffer for draw_rectangle_with_name
+        self._solid_buf = None
+        self._solid_color = None
+        # Tracker overlays are skipped when nobody reads processed frames for this long
+        self.output_idle_timeout = 5.0
+        # Detection runs on its own thread; run() only tracks, draws and notifies.
+        # With batched CNN detection the queues must hold at least one batch.
+        try:
+            queue_size = max(2, min(int(config_manager.get('detection_batch', 1)), 16))
+        except Exception:
+            queue_size = 2
+        try:
+            processes = max(0, min(int(config_manager.get('detector_processes', 0)), os.cpu_count() or 1))
+        except Exception:
+            processes = 0
+        pipeline = bool(config_manager.get('pipeline_preprocess', False))
+        self._detector = DetectorWorker(self.detector, maxsize=max(queue_size, processes), processes=processes,
+                                        pipeline=pipeline)
         self.running = True
         self.trackers = []
+        self._tracker_type = str(config_manager.get('tracker_type', 'auto') or 'auto').lower().strip()
+        self._tracker_ctor = self._resolve_tracker_ctor(self._tracker_type)
+        # 'auto' on large tracking frames prefers MOSSE (KCF's FFT cost grows with the window area)
+        self._tracker_ctor_large = self._resolve_tracker_ctor('mosse')
+        # A tracked face keeps its name (no re-encoding) for this many detections in a row
+        self.name_reuse_limit = 3
         self.notification_service = notification_service
         self.frame_count = 0  # Zähler für die Frame-Intervalle
         # Manual trigger state
         self.trigger_file = os.path.join('/data', 'manual_trigger.json')
         self._trigger_mtime = 0.0
+        # With inotify the trigger file is only re-checked after it was written/replaced;
+        # otherwise stat() runs at most every _trigger_check_interval seconds.
+        self._trigger_dirty = True
+        self._trigger_last_check = 0.0
+        self._trigger_check_interval = 0.2  # seconds
+        self._trigger_watching = self._start_trigger_watcher()
         self._trigger_active_until = 0.0
         self._trigger_next_allowed = 0.0
         self._trigger_fps = 0.0
@@ -40,6 +935,7 @@ class FrameProcessor(threading.Thread):
 
         # Fast config snapshot for the realtime loop (avoid filesystem stat() in hot path).
         self._cfg = {}
+        self._settings = DetectionSettings()
         self._cfg_refresh_interval = 1.0  # seconds
         self._cfg_next_refresh = 0.0
 
@@ -48,6 +944,7 @@ class FrameProcessor(threading.Thread):
             self._cfg = self.config_manager.get_snapshot()
         except Exception:
             self._cfg = {}
+        self._settings = DetectionSettings.from_config(self._cfg)
 
 
     def _refresh_cfg_if_needed(self):
@@ -59,23 +956,61 @@ class FrameProcessor(threading.Thread):
             cfg = self.config_manager.get_snapshot()
         except Exception:
             cfg = self._cfg or {}
+        if cfg is not self._cfg:
+            self._settings = DetectionSettings.from_config(cfg)
         self._cfg = cfg
         self._cfg_next_refresh = now + self._cfg_refresh_interval
 
         # Keep frequently used fields in sync (still cheap because this runs ~1x/sec)
         self.overlay_transparency = cfg.get('overlay_transparency', self.overlay_transparency)
         self.overlay_color = cfg.get('overlay_color', self.overlay_color)
+        self._update_overlay_style()
         self.enable_face_recognition_interval = cfg.get('enable_face_recognition_interval', self.enable_face_recognition_interval)
         self.face_recognition_interval = cfg.get('face_recognition_interval', self.face_recognition_interval)
+        tracker_type = str(cfg.get('tracker_type', self._tracker_type) or 'auto').lower().strip()
+        if tracker_type != self._tracker_type:
+            self._tracker_type = tracker_type
+            self._tracker_ctor = self._resolve_tracker_ctor(tracker_type)
 
 
-    
+    def _update_overlay_style(self):
+        """Precompute the clamped overlay alpha and the BGR overlay color for draw_rectangle_with_name."""
+        try:
+            self._overlay_alpha = max(0.0, min(float(self.overlay_transparency), 1.0))
+        except Exception:
+            self._overlay_alpha = 0.5
+        try:
+            # Convert overlay color from RGB (config) to BGR (OpenCV)
+            self._overlay_bgr = tuple(int(c) for c in self.overlay_color[::-1])
+        except Exception:
+            self._overlay_bgr = (0, 0, 0)
+
+    def _start_trigger_watcher(self) -> bool:
+        """Watch the trigger file via inotify; returns False if unavailable (poll fallback)."""
+        return watch_file(self.trigger_file, self._on_trigger_changed, on_stop=self._on_trigger_watch_stopped)
+
+    def _on_trigger_changed(self):
+        self._trigger_dirty = True
+
+    def _on_trigger_watch_stopped(self):
+        self._trigger_watching = False
+
     def _refresh_trigger(self):
         """Reload manual trigger file if changed and update trigger window state."""
+        if self._trigger_watching:
+            if not self._trigger_dirty:
+                return
+            self._trigger_dirty = False
+        else:
+            now = time.monotonic()
+            if (now - self._trigger_last_check) < self._trigger_check_interval:
+                return
+            self._trigger_last_check = now
         try:
-            if not os.path.exists(self.trigger_file):
+            try:
+                mtime = os.stat(self.trigger_file).st_mtime
+            except FileNotFoundError:
                 return
-            mtime = os.path.getmtime(self.trigger_file)
             if mtime <= self._trigger_mtime:
                 return
             self._trigger_mtime = mtime
@@ -85,6 +1020,9 @@ class FrameProcessor(threading.Thread):
 
             now = time.time()
             triggered_at = float(data.get('timestamp', now))
+            # The trigger file carries wall-clock time; deadlines are kept on the monotonic
+            # clock the frame loop reads (once per frame, immune to clock adjustments)
+            triggered_at += time.monotonic() - now
             duration = float(data.get('duration', 5))
             fps = float(data.get('fps', 3))
 
@@ -133,38 +1071,65 @@ class FrameProcessor(threading.Thread):
         except Exception as e:
             logging.warning(f"Failed to remove trigger file: {e}")
 
-    def _apply_clahe(self, frame_bgr):
-        """Optional contrast enhancement for low-light scenes."""
-        try:
-            ycrcb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2YCrCb)
-            y, cr, cb = cv2.split(ycrcb)
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-            y2 = clahe.apply(y)
-            merged = cv2.merge((y2, cr, cb))
-            return cv2.cvtColor(merged, cv2.COLOR_YCrCb2BGR)
-        except Exception:
-            return frame_bgr
+    @staticmethod
+    def _match_trackers(boxes, trackers, min_iou=0.5):
+        """For each detection box (in order) the unclaimed tracker that overlaps it best
+        (IoU > min_iou), else None."""
+        matches = [None] * len(boxes)
+        if not trackers or len(boxes) == 0:
+            return matches
+        iou = _iou_matrix(boxes, [t.get('bbox', (0, 0, 0, 0)) for t in trackers])
+        for i in range(iou.shape[0]):
+            j = int(iou[i].argmax())
+            if iou[i, j] > min_iou:
+                matches[i] = trackers[j]
+                # Each tracker can only be claimed by one detection
+                iou[:, j] = -1.0
+        return matches
 
-    def _blur_score(self, frame_bgr):
-        """Higher means sharper."""
-        try:
-            gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
-            return float(cv2.Laplacian(gray, cv2.CV_64F).var())
-        except Exception:
-            return 0.0
+    _TRACKER_CTORS = {
+        'kcf': 'TrackerKCF_create',
+        'csrt': 'TrackerCSRT_create',
+        'mosse': 'TrackerMOSSE_create',
+        'mil': 'TrackerMIL_create',
+    }
 
-    def _create_tracker(self):
-        """Create an OpenCV tracker with fallbacks for environments without opencv-contrib."""
-        for ctor in ("TrackerKCF_create", "TrackerCSRT_create", "TrackerMOSSE_create", "TrackerMIL_create"):
-            fn = getattr(cv2, ctor, None)
-            if callable(fn):
-                try:
-                    return fn()
-                except Exception:
-                    continue
+    @classmethod
+    def _resolve_tracker_ctor(cls, preferred='auto'):
+        """Pick a working OpenCV tracker constructor once (preferred type first, then fallbacks
+        for environments without opencv-contrib)."""
+        order = ['kcf', 'csrt', 'mosse', 'mil']
+        if preferred in order:
+            order.remove(preferred)
+            order.insert(0, preferred)
+        legacy = getattr(cv2, 'legacy', None)
+        for key in order:
+            name = cls._TRACKER_CTORS[key]
+            for module in (cv2, legacy):
+                fn = getattr(module, name, None) if module is not None else None
+                if callable(fn):
+                    try:
+                        fn()
+                    except Exception:
+                        continue
+                    return fn
         return None
 
+    # Tracking frames with at least this many pixels count as large for tracker_type 'auto'
+    LARGE_TRACKING_PIXELS = 1280 * 720
+
+    def _create_tracker(self, frame_shape=None):
+        """Create an OpenCV tracker (constructor resolved in _resolve_tracker_ctor)."""
+        ctor = self._tracker_ctor
+        if (self._tracker_type == 'auto' and frame_shape is not None and self._tracker_ctor_large is not None
+                and frame_shape[0] * frame_shape[1] >= self.LARGE_TRACKING_PIXELS):
+            ctor = self._tracker_ctor_large
+        return ctor() if ctor is not None else None
+
     def run(self):
+        if not self._detector.is_alive():
+            # Pay the models' cold-start cost before the first frame is detected
+            self._detector.start(warm_up=self._settings)
         # IMPORTANT: Never let this thread die silently. Any exception here kills face recognition,
         # notifications, snapshots and event log updates.
         while self.running:
@@ -175,7 +1140,8 @@ class FrameProcessor(threading.Thread):
                 if frame is not None:
                     self._refresh_trigger()
                     self._refresh_cfg_if_needed()
-                    now = time.time()
+                    # One timestamp per frame for all trigger decisions (see _refresh_trigger)
+                    now = time.monotonic()
                     trigger_active = now <= self._trigger_active_until
                     
                     # Trigger-Ende erkennen (ON -> OFF) und Cleanup laufen lassen
@@ -216,27 +1182,22 @@ class FrameProcessor(threading.Thread):
                     if trigger_allow:
                         # Throttle recognition during trigger window
                         self._trigger_next_allowed = now + (1.0 / self._trigger_fps)
-                        processed_frame = self.process_frame(frame, trigger_active=True)
+                        self._detector.submit(frame, self._settings, self._name_hints(now))
                     elif self.enable_face_recognition_interval and (self.frame_count % self.face_recognition_interval == 0):
-                        processed_frame = self.process_frame(frame, trigger_active=False)
-                    else:
-                        # Always update trackers between detections
-                        processed_frame = self.update_trackers(frame)
+                        self._detector.submit(frame, self._settings, self._name_hints(now))
 
+                    # Merge finished detections (re-inits trackers, notifies), then
+                    # always update trackers on the current frame for the stream.
                     try:
-                        self.processed_frame_queue.put_nowait(processed_frame)
-                    except queue.Full:
-                        # Drop older processed frames if the queue is full
-                        while not self.processed_frame_queue.empty():
-                            try:
-                                self.processed_frame_queue.get_nowait()
-                            except queue.Empty:
-                                break
-                        logging.debug("Processed frame queue was full and has been cleared.")
-                        try:
-                            self.processed_frame_queue.put_nowait(processed_frame)
-                        except Exception:
-                            pass
+                        det_frame, *detection = self._detector.out_queue.get_nowait()
+                    except queue.Empty:
+                        pass
+                    else:
+                        self.apply_detections(det_frame, *detection, now=now)
+                    processed_frame = self.update_trackers(frame)
+
+                    # Latest-frame slot: overwrites the previous frame, never blocks
+                    self.processed_frame_queue.put(processed_frame)
 
                 self.frame_count += 1
                 if self.frame_count % 100 == 0:
@@ -256,96 +1217,87 @@ class FrameProcessor(threading.Thread):
 
     def stop(self):
         self.running = False
+        self._detector.stop()
 
-    def process_frame(self, frame, trigger_active: bool = False):
-        start_time = time.time()
-        try:
-            self._refresh_cfg_if_needed()
-            cfg = self._cfg or {}
+    def _name_hints(self, now):
+        """(bbox, name) of tracked faces whose name may be reused without re-encoding.
 
-            scale_factor = float(cfg.get('face_scale_factor', 0.75))
-            # Clamp to reasonable range
-            if scale_factor < 0.25:
-                scale_factor = 0.25
-            if scale_factor > 1.0:
-                scale_factor = 1.0
-            small_frame = cv2.resize(frame, (0, 0), fx=scale_factor, fy=scale_factor)
-
-            # Optional blur filter: skip recognition on very blurry frames
-            if cfg.get('enable_blur_filter', False):
-                try:
-                    blur_threshold = float(cfg.get('blur_threshold', 100.0))
-                except Exception:
-                    blur_threshold = 100.0
-                score = self._blur_score(small_frame)
-                if score < blur_threshold:
-                    # No detection this round; just return tracker-updated frame
-                    return frame
-
-            # Optional low-light enhancement
-            if cfg.get('enable_clahe', False):
-                small_frame = self._apply_clahe(small_frame)
-
-            # Convert small frame to RGB from BGR, which OpenCV uses
-            rgb_small_frame = small_frame[:, :, ::-1]
-            
-            # Reset trackers on new detection
-            self.trackers = []
-            
-            # Detect faces
-            model = str(cfg.get('face_detection_model', 'hog')).lower().strip()
-            if model not in ('hog', 'cnn'):
-                model = 'hog'
-            # Upsampling helps detect smaller faces (at the cost of CPU).
-            # 0 = no upsample, 1–2 = common, 3 = heavy.
-            try:
-                upsample = int(cfg.get('face_upsample_times', 1))
-            except Exception:
-                upsample = 1
-            upsample = max(0, min(upsample, 3))
+        Unknown faces are reused too, except during a manual trigger: there a face that
+        turns towards the camera must be re-checked on every detection. now is the
+        time.monotonic() of the current frame, as passed to apply_detections().
+        """
+        reuse_unknown = now > self._trigger_active_until
+        return [(t['bbox'], t['name']) for t in self.trackers
+                if (reuse_unknown or t['name'] != 'Unknown') and t.get('reused', 0) < self.name_reuse_limit]
 
-            face_locations = face_recognition.face_locations(
-                rgb_small_frame,
-                number_of_times_to_upsample=upsample,
-                model=model
-            )
-            if trigger_active and face_locations:
-                self._trigger_saw_face = True
-            face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
-            
-            # Create a copy of the original frame to draw on
-        except Exception as e:
-            logging.exception(f"Face detection/encoding failed: {e}")
-            return frame
+    def apply_detections(self, frame, face_locations, face_encodings, scale_multiplier, reused_names=None,
+                         now=None):
+        """Match names, refresh trackers and notify for a finished detection.
 
-        marked_frame = frame.copy()
+        Only tracker and trigger state is updated; the stream frame is drawn by
+        update_trackers(). now is the caller's time.monotonic() for this frame.
+        """
+        start_time = time.monotonic()
+        if now is None:
+            now = start_time
+        trigger_active = now <= self._trigger_active_until
+        draw_overlay = self._settings.enable_face_overlay
 
         # Manual trigger behavior:
         # Only create images/events if at least one face was detected.
         # (No snapshot/event when trigger fires but no person is in frame.)
+        if not face_locations:
+            # Nothing to draw: drop the trackers and skip the full-frame copy
+            self.trackers = []
+            return
 
-        for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-            name = self.face_loader.get_name(face_encoding)
-            # Initialize a new tracker for each face
-            tracker = self._create_tracker()
-            # Convert face location from small frame scale to original scale
-            # Skalierung zurücksetzen
-            # IMPORTANT: scale_factor is typically not a clean divisor (e.g. 0.75).
-            # Using int(1/scale_factor) truncates (1/0.75 -> 1) and breaks the rescaling.
-            scale_multiplier = 1.0 / float(scale_factor)
-            top = int(round(top * scale_multiplier))
-            right = int(round(right * scale_multiplier))
-            bottom = int(round(bottom * scale_multiplier))
-            left = int(round(left * scale_multiplier))
-            bbox = (left, top, right - left, bottom - top)
-            if tracker is not None:
-                tracker.init(frame, bbox)
-                self.trackers.append({'tracker': tracker, 'name': name})
+        if trigger_active:
+            self._trigger_saw_face = True
+
+        # Event images get the overlays, drawn onto a copy so trackers for later faces are
+        # initialized on the clean frame (nothing is drawn with overlays off; notify()
+        # takes its own copy of the frame anyway)
+        marked_frame = frame.copy() if draw_overlay else frame
+
+        # Match all encoded faces of this frame in one batched call
+        matched = iter(self.face_loader.get_names_batch(face_encodings) if face_encodings else [])
+        if reused_names is None:
+            reused_names = [None] * len(face_locations)
+        names = [reused if reused is not None else next(matched, 'Unknown') for reused in reused_names]
+
+        # Convert face locations from small frame scale to original scale (all at once)
+        # Skalierung zurücksetzen
+        locs = _scale_locations(face_locations, scale_multiplier)
+        boxes = _locations_to_xywh(locs)
+
+        # Trackers that overlap a new detection are kept; the rest are replaced
+        matches = self._match_trackers(boxes, self.trackers)
+        new_trackers = []
+        views = {}
+        scale = self._settings.tracker_scale
+        # Boxes in tracking-view coordinates, scaled once for all new trackers
+        track_boxes = np.rint(boxes * scale).astype(np.int32).tolist() if scale < 1.0 else boxes.tolist()
+
+        for (top, right, bottom, left), bbox, track_box, name, reused, tracked in zip(
+                locs.tolist(), map(tuple, boxes.tolist()), track_boxes, names, reused_names, matches):
+            if tracked is not None:
+                tracked['name'] = name
+                tracked['bbox'] = bbox
+                # Count consecutive reuses so the name is re-verified every name_reuse_limit detections
+                tracked['reused'] = tracked.get('reused', 0) + 1 if reused is not None else 0
+                new_trackers.append(tracked)
+            else:
+                # Initialize a new tracker only for genuinely new faces
+                view = self._tracking_view(frame, scale, views)
+                tracker = self._create_tracker(view.shape)
+                if tracker is not None:
+                    tracker.init(view, tuple(track_box))
+                    new_trackers.append({'tracker': tracker, 'name': name, 'bbox': bbox, 'scale': scale})
             # Draw rectangles and notify
-            if cfg.get('enable_face_overlay', True):
+            if draw_overlay:
                 marked_frame = self.draw_rectangle_with_name(marked_frame, top, right, bottom, left, name)
             # Trigger-aware notification: allow one forced notification per manual trigger
-            now = time.time()
+            # (re-read per face: stop_on_match may have ended the trigger)
             trigger_active = now <= self._trigger_active_until
             
             if trigger_active:
@@ -370,35 +1322,82 @@ class FrameProcessor(threading.Thread):
                 except Exception as e:
                     logging.exception(f"Notification failed for {name}: {e}")
 
-            processing_time = time.time() - start_time
+            processing_time = time.monotonic() - start_time
             logging.debug(f"Frame processed in {processing_time:.2f} seconds")
 
-        return marked_frame
+        self.trackers = new_trackers
 
     def update_trackers(self, frame):
         self._refresh_cfg_if_needed()
-        cfg = self._cfg or {}
         new_trackers = []
-        updated_frame = frame.copy()  # Erstelle eine Kopie für Updates
+        # Respect overlay toggle for tracker-only updates as well, and don't draw for nobody
+        draw = bool(self.trackers) and self._settings.enable_face_overlay and self._output_watched()
+        updated_frame = frame.copy() if draw else frame  # Erstelle eine Kopie für Updates
+        raw_boxes = []
+        views = {}
         for tracked in self.trackers:
-            tracker = tracked['tracker']
-            name = tracked['name']
-            success, box = tracker.update(updated_frame)
+            # Track on the clean (optionally downscaled) frame, not on the copy with overlays
+            scale = tracked.get('scale', 1.0)
+            success, box = tracked['tracker'].update(self._tracking_view(frame, scale, views))
             if success:
-                left, top, width, height = [int(v) for v in box]
-                right, bottom = left + width, top + height
-                # Respect overlay toggle for tracker-only updates as well
-                if cfg.get('enable_face_overlay', True):
+                raw_boxes.append([v / scale for v in box] if scale < 1.0 else box)
+                new_trackers.append(tracked)
+            else:
+                logging.debug(f"Tracking failed for {tracked['name']}, removing tracker.")
+
+        if new_trackers:
+            # One cast for all boxes (x, y, w, h) instead of per-value int() calls
+            boxes = np.asarray(raw_boxes, dtype=np.float64).astype(np.int32).tolist()
+            for tracked, (left, top, width, height) in zip(new_trackers, boxes):
+                tracked['bbox'] = (left, top, width, height)
+                if draw:
+                    name = tracked['name']
                     try:
-                        updated_frame = self.draw_rectangle_with_name(updated_frame, top, right, bottom, left, name)
+                        updated_frame = self.draw_rectangle_with_name(updated_frame, top, left + width,
+                                                                      top + height, left, name)
                     except Exception as e:
                         logging.debug(f"Failed to draw tracker overlay for {name}: {e}")
-                new_trackers.append(tracked)
-            else:
-                logging.debug(f"Tracking failed for {name}, removing tracker.")
         self.trackers = new_trackers
         return updated_frame
 
+    def _tracking_view(self, frame, scale, views):
+        """Frame downscaled for the trackers (cached per scale in views for this frame).
+
+        The resize writes into a persistent per-scale buffer; trackers copy what they need
+        in init()/update(), so the buffer can be reused on the next frame.
+        """
+        if scale >= 1.0:
+            return frame
+        view = views.get(scale)
+        if view is None:
+            h, w = frame.shape[:2]
+            size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+            buf = FaceDetector._reuse_buffer(self._track_bufs.get(scale), (size[1], size[0]) + frame.shape[2:])
+            self._track_bufs[scale] = buf
+            view = views[scale] = cv2.resize(frame, size, dst=buf, interpolation=cv2.INTER_AREA)
+        return view
+
+    def _output_watched(self):
+        """False once the processed-frame consumer has been idle for output_idle_timeout seconds."""
+        last_consumed = getattr(self.processed_frame_queue, 'last_consumed', None)
+        if last_consumed is None:
+            return True
+        return (time.monotonic() - last_consumed()) <= self.output_idle_timeout
+
+    def _solid_overlay(self, shape, color):
+        """Return a shape-sized view of a cached solid-color buffer (grown/refilled on demand)."""
+        buf = self._solid_buf
+        if (buf is None or self._solid_color != color or buf.shape[2:] != tuple(shape[2:])
+                or buf.shape[0] < shape[0] or buf.shape[1] < shape[1]):
+            alloc = tuple(shape)
+            if buf is not None and buf.shape[2:] == alloc[2:]:
+                alloc = (max(alloc[0], buf.shape[0]), max(alloc[1], buf.shape[1])) + alloc[2:]
+            buf = np.empty(alloc, dtype=np.uint8)
+            buf[:, :] = color
+            self._solid_buf = buf
+            self._solid_color = color
+        return buf[:shape[0], :shape[1]]
+
     def draw_rectangle_with_name(self, frame, top, right, bottom, left, name):
         """Draw a semi-transparent filled face box + name label.
 
@@ -420,14 +1419,9 @@ class FrameProcessor(threading.Thread):
 
             border_color = (255, 255, 255)  # white
             border_thickness = 1
-            transparency = float(self.overlay_transparency)
-            if transparency < 0.0:
-                transparency = 0.0
-            if transparency > 1.0:
-                transparency = 1.0
-
-            # Convert overlay color from RGB (config) to BGR (OpenCV)
-            overlay_color = tuple(int(c) for c in self.overlay_color[::-1])
+            # Clamped transparency + BGR color are precomputed in _update_overlay_style()
+            transparency = self._overlay_alpha
+            overlay_color = self._overlay_bgr
 
             # Draw border (outline) directly (cheap)
             cv2.rectangle(
@@ -443,12 +1437,14 @@ class FrameProcessor(threading.Thread):
             if roi.size == 0:
                 return frame
 
-            # Make a solid overlay for the ROI
-            overlay = roi.copy()
-            overlay[:, :] = overlay_color
-
             # Keep legacy semantics: transparency=0 => fully colored overlay; transparency=1 => original
-            cv2.addWeighted(overlay, 1.0 - transparency, roi, transparency, 0.0, roi)
+            if transparency <= 0.0:
+                # Opaque: plain in-place fill, no blend
+                roi[:] = overlay_color
+            elif transparency < 1.0:
+                # Solid color buffer, reused across faces/frames and sliced to the ROI size
+                overlay = self._solid_overlay(roi.shape, overlay_color)
+                cv2.addWeighted(overlay, 1.0 - transparency, roi, transparency, 0.0, roi)
 
             # Text
             font_scale = 1.0
@@ -459,15 +1455,18 @@ class FrameProcessor(threading.Thread):
             if text_y > h - 5:
                 text_y = max(15, top_i - 10)
 
-            cv2.putText(
-                frame,
-                str(name),
-                (left_i, text_y),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                font_scale,
-                (255, 255, 255),
-                font_thickness,
-            )
+            # White label from the cached sprite: putText() blends white by glyph coverage,
+            # dst += (255 - dst) * coverage / 255, which is replayed here
+            sprite, pad, ascent = _render_name_sprite(str(name), font_scale, font_thickness)
+            x0 = left_i - pad
+            y0 = text_y - ascent - pad
+            sx0, sy0 = max(0, -x0), max(0, -y0)
+            sx1 = min(sprite.shape[1], w - x0)
+            sy1 = min(sprite.shape[0], h - y0)
+            if sx1 > sx0 and sy1 > sy0:
+                dst = frame[y0 + sy0:y0 + sy1, x0 + sx0:x0 + sx1]
+                coverage = sprite[sy0:sy1, sx0:sx1]
+                cv2.add(dst, cv2.multiply(cv2.bitwise_not(dst), coverage, scale=1.0 / 255), dst=dst)
         except Exception as e:
             # Never raise from overlay rendering; return the original frame unchanged.
             logging.debug(f"Failed to draw rectangle with name (ROI overlay): {e}")
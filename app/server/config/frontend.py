@@ -1,13 +1,12 @@
 import os
 import shutil
-from pathlib import Path
 from typing import Tuple
-from flask import Flask, render_template, request, redirect, url_for, jsonify, send_from_directory, send_file
+from flask import Flask, Response, render_template, request, redirect, url_for, jsonify, send_from_directory, send_file, stream_with_context
 from werkzeug.utils import secure_filename
 import re
+import functools
 from urllib.parse import urlparse, quote
 import logging
-import json
 import time
 import requests
 from flask import send_file
@@ -15,21 +14,47 @@ from datetime import datetime
 import unicodedata
 import tempfile
 
+try:
+    # Optional: production WSGI server (Flask's dev server is the fallback)
+    from waitress import serve
+except ImportError:
+    serve = None
+
 # Keep event log consistent when images are deleted via the GUI cleanup action.
-from notification.service import prune_event_log
+from notification.service import prune_event_log, dumps_bytes, loads as json_loads
 
 UPLOAD_FOLDER = '/data/knownfaces'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+# Browser cache lifetime (seconds) of event images
+EVENT_IMAGE_MAX_AGE = 3600
+
+# Precompiled patterns for the name/color validators (called on every upload/config POST)
+_NAME_BAD_RE = re.compile(r"[\\/\x00-\x1f:<>\|\?\*]+")
+_WS_RE = re.compile(r"\s+")
+_NAME_FILE_BAD_RE = re.compile(r"[^a-z0-9_]")
+_HEX_COLOR_RE = re.compile(r'^#(?:[0-9a-fA-F]{3}){1,2}$')
+_TRUTHY = frozenset(('true', '1', 't', 'y', 'yes', 'on'))
+_FALSY = frozenset(('false', '0', 'f', 'n', 'no'))
+
+
+@functools.lru_cache(maxsize=8)
+def _resolved_base(base_dir: str) -> str:
+    # The served base folders (e.g. UPLOAD_FOLDER) never move; resolve them once
+    return os.path.realpath(base_dir)
 
 
 def safe_path(base_dir: str, relative_path: str) -> str:
-    """Resolve a user-provided relative path safely under base_dir."""
-    base = Path(base_dir).resolve()
+    """Resolve a user-provided relative path safely under base_dir.
+
+    The candidate is fully resolved (symlinks included) before the containment check, so a
+    symlink inside base_dir cannot point the result outside of it.
+    """
+    base = _resolved_base(base_dir)
     rel = (relative_path or "").lstrip("/").replace("\\", "/")
-    candidate = (base / rel).resolve()
+    candidate = os.path.realpath(os.path.join(base, rel))
     # Ensure candidate is within base
-    if base == candidate or str(candidate).startswith(str(base) + os.sep):
-        return str(candidate)
+    if os.path.commonpath([base, candidate]) == base:
+        return candidate
     raise ValueError("Invalid path")
 
 def sanitize_person_name(name: str) -> str:
@@ -38,9 +63,9 @@ def sanitize_person_name(name: str) -> str:
         return ""
     name = name.strip().strip('"').strip("'").strip()
     # Replace path separators and other problematic chars
-    name = re.sub(r"[\\/\x00-\x1f:<>\|\?\*]+", "_", name)
+    name = _NAME_BAD_RE.sub("_", name)
     # Collapse whitespace
-    name = re.sub(r"\s+", " ", name).strip()
+    name = _WS_RE.sub(" ", name).strip()
     return name
 
 def normalize_person_name(name: str) -> str:
@@ -56,8 +81,8 @@ def normalize_person_name(name: str) -> str:
     name = unicodedata.normalize("NFKD", name)
     name = name.encode("ascii", "ignore").decode("ascii")
     name = name.lower().strip()
-    name = re.sub(r"\s+", "_", name)
-    name = re.sub(r"[^a-z0-9_]", "", name)
+    name = _WS_RE.sub("_", name)
+    name = _NAME_FILE_BAD_RE.sub("", name)
     return name
 
 def current_timestamp_str() -> str:
@@ -129,6 +154,10 @@ def create_optimized_face_image(
 
 
 
+# Last get_known_faces_structure() result and the directory signature it was built from
+_faces_cache = {"sig": None, "val": None}
+
+
 def get_known_faces_structure(base_dir: str):
     """Return dict: {person_name: [relative_paths...]}, plus root images under key '__root__'.
 
@@ -136,24 +165,52 @@ def get_known_faces_structure(base_dir: str):
     """
     persons = {}
     root_images = []
-    if not os.path.isdir(base_dir):
+    try:
+        with os.scandir(base_dir) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except (FileNotFoundError, NotADirectoryError):
         return persons, root_images
 
-    for entry in sorted(os.listdir(base_dir)):
-        p = os.path.join(base_dir, entry)
-        if os.path.isdir(p):
-            person = entry
-            opt_files = [fn for fn in sorted(os.listdir(p)) if fn.lower().endswith('_opt.jpg')]
+    # Directory mtimes only change on upload/rename/delete: while the top level and every
+    # person folder are unchanged, the previous result is still valid (read-only for callers)
+    dirs = [e for e in entries if e.is_dir()]
+    sig = (base_dir, os.stat(base_dir).st_mtime_ns, tuple((e.name, e.stat().st_mtime_ns) for e in dirs))
+    if _faces_cache["sig"] == sig:
+        return _faces_cache["val"]
+
+    for entry in entries:
+        if entry.is_dir():
+            person = entry.name
+            with os.scandir(entry.path) as it:
+                opt_files = sorted(e.name for e in it if e.name.lower().endswith('_opt.jpg'))
             imgs = [f"{person}/{fn}" for fn in opt_files]
             persons.setdefault(person, imgs)
         else:
-            if entry.lower().endswith('_opt.jpg'):
-                root_images.append(entry)
+            if entry.name.lower().endswith('_opt.jpg'):
+                root_images.append(entry.name)
 
+    _faces_cache["sig"], _faces_cache["val"] = sig, (persons, root_images)
     return persons, root_images
 
 
 
+def iter_lines_reversed(f, chunk_size: int = 64 * 1024):
+    """Yield the lines of a binary file from last to first, reading fixed-size chunks from the end."""
+    f.seek(0, os.SEEK_END)
+    pos = f.tell()
+    rest = b""
+    while pos > 0:
+        step = min(chunk_size, pos)
+        pos -= step
+        f.seek(pos)
+        lines = (f.read(step) + rest).split(b"\n")
+        # The first piece may be cut mid-line; it is completed by the next (earlier) chunk
+        rest = lines[0]
+        for line in reversed(lines[1:]):
+            yield line
+    yield rest
+
+
 def allowed_file(filename):
     return '.' in filename and \
         filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -171,9 +228,10 @@ def validate_int(value, default, min_value=None, max_value=None):
 
 def validate_bool(value, default):
     logging.debug(value)
-    if str(value).lower() in ['true', '1', 't', 'y', 'yes', 'on']:
+    value = str(value).lower()
+    if value in _TRUTHY:
         return True
-    elif str(value).lower() in ['false', '0', 'f', 'n', 'no']:
+    elif value in _FALSY:
         return False
     else:
         return default
@@ -181,7 +239,7 @@ def validate_bool(value, default):
 
 # Funktion zur Validierung von Hex-Farben
 def validate_hex_color(value, default):
-    if value and re.match(r'^#(?:[0-9a-fA-F]{3}){1,2}$', value):
+    if value and _HEX_COLOR_RE.match(value):
         return value
     else:
         return default
@@ -220,6 +278,42 @@ def validate_float(value, default, min_value=0.0, max_value=1.0):
         return default
 
 
+def validate_text(value, default):
+    return (default if value is None else value).strip()
+
+
+_DEFAULT_MESSAGE = '[[name]], spotted at [[time]] on [[date]]!'
+
+# (form field, validator, extra validator args) of the settings form, validated in one pass
+_FORM_FIELDS = (
+    ('input_stream_url', validate_url, ('',)),
+    ('overlay_border', validate_int, (1, 1, 4)),
+    ('enable_face_overlay', validate_bool, (True,)),
+    ('output_width', validate_int, (640, 100, 4000)),
+    ('output_height', validate_int, (480, 100, 4000)),
+    ('custom_message_udp', validate_text, (_DEFAULT_MESSAGE,)),
+    ('custom_message_http', validate_text, (_DEFAULT_MESSAGE,)),
+    ('use_udp', validate_bool, (False,)),
+    ('use_web', validate_bool, (False,)),
+    ('use_loxone_vti', validate_bool, (False,)),
+    ('loxone_ip', validate_text, ('',)),
+    ('loxone_user', validate_text, ('',)),
+    ('loxone_pass', validate_text, ('',)),
+    ('loxone_text_input', validate_text, ('',)),
+    ('udp_service_port', validate_port, ()),
+    ('notification_delay', validate_int, (60, 10, 300)),
+    ('enable_stream_suspend', validate_bool, (False,)),
+    ('enable_face_recognition_interval', validate_bool, (False,)),
+    ('face_recognition_interval', validate_int, (60, 2, 300)),
+    ('face_scale_factor', validate_float, (0.75, 0.25, 1.0)),
+    ('face_upsample_times', validate_int, (1, 0, 3)),
+    ('face_match_threshold', validate_float, (0.55, 0.30, 0.80)),
+    ('enable_clahe', validate_bool, (False,)),
+    ('enable_blur_filter', validate_bool, (False,)),
+    ('blur_threshold', validate_float, (100.0, 0.0, 5000.0)),
+)
+
+
 class ConfigFrontend:
     def __init__(self, config_manager):
         self.app = Flask(__name__)
@@ -277,8 +371,22 @@ class ConfigFrontend:
 
             trigger_file = os.path.join('/data', 'manual_trigger.json')
             try:
-                with open(trigger_file, 'w') as f:
-                    json.dump(payload, f)
+                # Write a temp file and rename it over the trigger file: readers (processor,
+                # camera, stream) see either the old or the new payload, never a torn one
+                fd, tmp = tempfile.mkstemp(prefix='.manual_trigger.', suffix='.tmp',
+                                           dir=os.path.dirname(trigger_file))
+                try:
+                    # mkstemp creates 0600; keep the previous world-readable mode
+                    os.fchmod(fd, 0o644)
+                    with os.fdopen(fd, 'wb') as f:
+                        f.write(dumps_bytes(payload))
+                    os.replace(tmp, trigger_file)
+                except BaseException:
+                    try:
+                        os.unlink(tmp)
+                    except OSError:
+                        pass
+                    raise
                 return jsonify({'status': 'ok', 'trigger': payload})
             except Exception as e:
                 logging.error(f"Failed to write trigger file {trigger_file}: {e}")
@@ -319,49 +427,21 @@ class ConfigFrontend:
             transparency_value = int(round((self.config_manager.get('overlay_transparency')) * 100))
             persons, root_images = get_known_faces_structure(UPLOAD_FOLDER)
             if request.method == 'POST':
-                new_config = {
-                    'input_stream_url': validate_url(request.form.get('input_stream_url'), ''),
-                    'overlay_color': self.config_manager.hex_to_rgb(request.form.get('overlay_color')),
-                    'overlay_transparency': validate_int(request.form.get('overlay_transparency'), 0, 0, 100) / 100,
-                    'overlay_border': validate_int(request.form.get('overlay_border'), 1, 1, 4),
-                    'enable_face_overlay': validate_bool(request.form.get('enable_face_overlay'), True),
-                    'output_width': validate_int(request.form.get('output_width'), 640, 100, 4000),
-                    'output_height': validate_int(request.form.get('output_height'), 480, 100, 4000),
-                    'custom_message_udp': request.form.get('custom_message_udp',
-                                                           '[[name]], spotted at [[time]] on [[date]]!').strip(),
-                    'custom_message_http': request.form.get('custom_message_http',
-                                                            '[[name]], spotted at [[time]] on [[date]]!').strip(),
-                    'use_udp': validate_bool(request.form.get('use_udp'), False),
-                    'use_web': validate_bool(
-                        request.form.get('use_web'), False),
-                    'use_loxone_vti': validate_bool(request.form.get('use_loxone_vti'), False),
-                    'loxone_ip': request.form.get('loxone_ip', '').strip(),
-                    'loxone_user': request.form.get('loxone_user', '').strip(),
-                    'loxone_pass': request.form.get('loxone_pass', '').strip(),
-                    'loxone_text_input': request.form.get('loxone_text_input', '').strip(),
-                    'web_service_url': request.form.get('web_service_url'),
-                    'udp_service_url': request.form.get('udp_service_url'),
-                    'udp_service_port': validate_port(request.form.get('udp_service_port')),
-                    'notification_delay': validate_int(request.form.get('notification_delay'), 60, 10, max_value=300),
-                    'enable_stream_suspend': validate_bool(request.form.get('enable_stream_suspend'), False),
-                    'enable_face_recognition_interval': validate_bool(
-                        request.form.get('enable_face_recognition_interval'), False
-                    ),
-                    'face_recognition_interval': validate_int(request.form.get('face_recognition_interval'), 60, 2,
-                                                              max_value=300),
-                    'face_scale_factor': validate_float(request.form.get('face_scale_factor'), 0.75, 0.25, 1.0),
-                    'face_upsample_times': validate_int(request.form.get('face_upsample_times'), 1, 0, max_value=3),
-                    'face_detection_model': (request.form.get('face_detection_model') or 'hog').strip().lower(),
-                    'face_match_threshold': validate_float(request.form.get('face_match_threshold'), 0.55, 0.30, 0.80),
-                    'enable_clahe': validate_bool(request.form.get('enable_clahe'), False),
-                    'enable_blur_filter': validate_bool(request.form.get('enable_blur_filter'), False),
-                    'blur_threshold': validate_float(request.form.get('blur_threshold'), 100.0, 0.0, 5000.0),
-                    'eventimage_cleanup_days': validate_int(request.form.get('eventimage_cleanup_days'), self.config_manager.get('eventimage_cleanup_days', 0), 0, max_value=3650)
-                }
+                form = request.form.to_dict()
+                new_config = {key: validator(form.get(key), *args) for key, validator, args in _FORM_FIELDS}
+                new_config.update({
+                    # Invalid input keeps the current color instead of failing the whole save
+                    'overlay_color': self.config_manager.hex_to_rgb(validate_hex_color(form.get('overlay_color'), hex_color)),
+                    'overlay_transparency': validate_int(form.get('overlay_transparency'), 0, 0, 100) / 100,
+                    'web_service_url': form.get('web_service_url'),
+                    'udp_service_url': form.get('udp_service_url'),
+                    'face_detection_model': (form.get('face_detection_model') or 'hog').strip().lower(),
+                    'eventimage_cleanup_days': validate_int(form.get('eventimage_cleanup_days'), self.config_manager.get('eventimage_cleanup_days', 0), 0, max_value=3650)
+                })
                 combined = {**self.config_manager.config, **new_config}
 
                 # Normalize tuning options
-                if combined.get('face_detection_model') not in ('hog', 'cnn'):
+                if combined.get('face_detection_model') not in ('hog', 'cnn', 'scrfd'):
                     combined['face_detection_model'] = 'hog'
 
                 # Mutual exclusivity: stream suspend only allowed when interval is disabled
@@ -506,7 +586,9 @@ class ConfigFrontend:
                 return "Invalid path", 400
             if not os.path.isfile(file_path):
                 return "Not found", 404
-            return send_file(file_path)
+            # Re-uploading a photo with the same name replaces the file, so browsers must
+            # revalidate; conditional requests (ETag / Last-Modified) then return 304 bodyless
+            return send_file(file_path, conditional=True, etag=True, max_age=None)
 
         @self.app.route('/delete_image/<path:filename>', methods=['POST'])
         def delete_image(filename):
@@ -560,7 +642,8 @@ class ConfigFrontend:
             try:
                 if not os.path.exists(image_path) or not os.path.isdir(image_path):
                     raise FileNotFoundError('The specified image directory does not exist.')
-                return send_from_directory(image_path, filename)
+                # Event image names carry their timestamp and are never rewritten: let browsers cache them
+                return send_from_directory(image_path, filename, conditional=True, max_age=EVENT_IMAGE_MAX_AGE)
             except FileNotFoundError as e:
                 return str(e), 404
 
@@ -571,11 +654,14 @@ class ConfigFrontend:
             image_path = os.path.join(base_dir, self.config_manager.get('image_path'))
             if not os.path.exists(image_path) or not os.path.isdir(image_path):
                 return 'The specified image directory does not exist.', 404
-            imgs = [f for f in os.listdir(image_path) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+            # scandir: type and (cached) stat come from the directory entry, no extra lookups
+            with os.scandir(image_path) as it:
+                imgs = [(e.stat().st_mtime, e.name) for e in it
+                        if e.name.lower().endswith(('.jpg', '.jpeg', '.png')) and e.is_file()]
             if not imgs:
                 return 'No event images available.', 404
-            imgs.sort(key=lambda fn: os.path.getmtime(os.path.join(image_path, fn)), reverse=True)
-            return redirect(url_for('event_image', filename=imgs[0]))
+            newest = max(imgs)[1]
+            return redirect(url_for('event_image', filename=newest))
 
 
 
@@ -583,26 +669,45 @@ class ConfigFrontend:
         def event_log():
             """Return event log entries as JSON list for the Event Log tab (Tabulator)."""
             log_file = self.config_manager.get('log_file', '/data/event_log.json')
-            entries = []
+            # Newest `limit` entries (0 = all); only that window of the file is read
+            default_limit = validate_int(self.config_manager.get('event_log_limit', 500), 500, 0)
+            limit = validate_int(request.args.get('limit'), default_limit, 0)
             try:
-                if os.path.exists(log_file):
-                    with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
-                        for line in f:
-                            line = line.strip()
+                f = open(log_file, 'rb')
+            except FileNotFoundError:
+                f = None
+            except Exception as e:
+                logging.exception("Failed to read event log file: %s", e)
+                f = None
+            if f is None:
+                resp = jsonify([])
+            else:
+                def generate():
+                    # Most recent first, streamed as one JSON array of the original lines
+                    try:
+                        yield '['
+                        count = 0
+                        for raw in iter_lines_reversed(f):
+                            line = raw.decode('utf-8', errors='replace').strip()
                             if not line:
                                 continue
                             try:
-                                entries.append(json.loads(line))
+                                json_loads(line)
                             except Exception:
                                 # Ignore malformed lines
                                 continue
-            except Exception as e:
-                logging.exception("Failed to read event log file: %s", e)
-                return jsonify([])
+                            yield (',' if count else '') + line
+                            count += 1
+                            if limit and count >= limit:
+                                break
+                        yield ']'
+                    except Exception as e:
+                        logging.exception("Failed to read event log file: %s", e)
+                        yield ']'
+                    finally:
+                        f.close()
 
-            # Most recent first
-            entries.reverse()
-            resp = jsonify(entries)
+                resp = Response(stream_with_context(generate()), mimetype='application/json')
             # Prevent browser/proxy caching so the Event Log updates reliably without hard refresh.
             resp.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
             resp.headers['Pragma'] = 'no-cache'
@@ -640,17 +745,17 @@ class ConfigFrontend:
             deleted = 0
             deleted_files = []
             errors = 0
-            for fn in os.listdir(image_path):
-                if not fn.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    continue
-                p = os.path.join(image_path, fn)
-                try:
-                    if os.path.isfile(p) and os.path.getmtime(p) < cutoff:
-                        os.remove(p)
-                        deleted += 1
-                        deleted_files.append(fn)
-                except Exception:
-                    errors += 1
+            with os.scandir(image_path) as it:
+                for e in it:
+                    if not e.name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                        continue
+                    try:
+                        if e.is_file() and e.stat().st_mtime < cutoff:
+                            os.unlink(e.path)
+                            deleted += 1
+                            deleted_files.append(e.name)
+                    except Exception:
+                        errors += 1
 
             # Prune event_log.json to remove entries whose images were deleted.
             try:
@@ -664,10 +769,12 @@ class ConfigFrontend:
             return jsonify({'status': 'ok', 'message': msg, 'deleted': deleted, 'errors': errors, 'days': days_int})
     def run(self):
         """Run the configuration frontend (port 5000)."""
+        if serve is not None:
+            serve(self.app, host='0.0.0.0', port=5000, threads=8)
+            return
         self.app.run(
             host='0.0.0.0',
             port=5000,
             threaded=True,
             use_reloader=False,
-            debug=True,
         )
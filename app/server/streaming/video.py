@@ -4,24 +4,59 @@ import signal
 import logging
 import os
 import json
+import hashlib
 from flask import Flask, Response, stream_with_context
 import cv2
 import queue
 import numpy as np
 
+from config.watch import watch_file
+
+try:
+    # Optional: production WSGI server (Flask's dev server is the fallback)
+    from waitress import serve
+except ImportError:
+    serve = None
+
+try:
+    # Optional: libjpeg-turbo SIMD encoder for the MJPEG stream
+    from turbojpeg import TurboJPEG
+except ImportError:
+    TurboJPEG = None
+
+# Multipart header in front of every JPEG of the MJPEG stream
+_BOUNDARY = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+
+
+# (signature, (triggered_at, duration)) of the last parsed trigger file; swapped as one
+# tuple so concurrent stream clients never see a signature with another file's window
+_TRIGGER_CACHE = {"entry": (None, None)}
 
 
 def is_manual_trigger_active(config_manager, trigger_file='/data/manual_trigger.json'):
-    """Return True if manual trigger is active (including grace seconds)."""
+    """Return True if manual trigger is active (including grace seconds).
+
+    The file is only re-read when its mtime/size changes; otherwise this is one stat().
+    """
     try:
-        if not os.path.exists(trigger_file):
+        try:
+            st = os.stat(trigger_file)
+        except FileNotFoundError:
             return False
-        with open(trigger_file, 'r') as f:
-            data = json.load(f)
+        sig = (trigger_file, st.st_mtime_ns, st.st_size)
+        cached_sig, window = _TRIGGER_CACHE["entry"]
+        if cached_sig != sig:
+            with open(trigger_file, 'r') as f:
+                data = json.load(f)
+            triggered_at = float(data.get('timestamp', 0.0))
+            duration = float(data.get('duration', 0.0))
+            duration = max(0.0, min(duration, 120.0))
+            window = (triggered_at, duration)
+            _TRIGGER_CACHE["entry"] = (sig, window)
+        triggered_at, duration = window
         now = time.time()
-        triggered_at = float(data.get('timestamp', 0.0))
-        duration = float(data.get('duration', 0.0))
-        duration = max(0.0, min(duration, 120.0))
+        if now <= triggered_at + duration:
+            return True
         grace = 10.0
         try:
             grace = float(config_manager.get('stream_suspend_grace_seconds', 10) or 0)
@@ -33,47 +68,79 @@ def is_manual_trigger_active(config_manager, trigger_file='/data/manual_trigger.
         return False
 
 
+# Per frame size: band rows and text placement of the pause overlay (see _pause_layout)
+_PAUSE_LAYOUTS = {}
+_PAUSE_LABEL = "Suspend"
+_PAUSE_FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def _pause_layout(h, w):
+    """(band_y0, band_y1, text_origin, font_scale, thickness), computed once per frame size."""
+    layout = _PAUSE_LAYOUTS.get((h, w))
+    if layout is None:
+        band_h = max(80, int(h * 0.18))
+        y0 = (h - band_h) // 2
+        font_scale = max(1.2, w / 900.0)
+        thickness = max(2, int(w / 500))
+        (tw, th), _ = cv2.getTextSize(_PAUSE_LABEL, _PAUSE_FONT, font_scale, thickness)
+        layout = (y0, y0 + band_h, ((w - tw) // 2, (h + th) // 2), font_scale, thickness)
+        if len(_PAUSE_LAYOUTS) >= 8:
+            _PAUSE_LAYOUTS.clear()
+        _PAUSE_LAYOUTS[(h, w)] = layout
+    return layout
+
+
 def add_pause_overlay(frame):
     """Draw a straight 'Suspend' overlay with a lightly blurred background."""
-    overlay = frame.copy()
+    h, w = frame.shape[:2]
 
-    # Light background blur (keep text sharp by drawing after blur)
+    # Light background blur (keep text sharp by drawing after blur).
+    # Blurring at 1/16 of the pixels and scaling back up looks the same as sigma 8 at full size.
     try:
-        overlay = cv2.GaussianBlur(overlay, (0, 0), 8)
+        small = cv2.pyrDown(cv2.pyrDown(frame))
+        small = cv2.GaussianBlur(small, (0, 0), 2)
+        overlay = cv2.resize(small, (w, h), interpolation=cv2.INTER_LINEAR)
     except Exception:
         # If blur fails for any reason, fall back to unblurred
         overlay = frame.copy()
 
-    h, w = overlay.shape[:2]
+    y0, y1, text_origin, font_scale, thickness = _pause_layout(h, w)
 
     # Semi-transparent dark band behind the text for readability
-    band_h = max(80, int(h * 0.18))
-    y0 = (h - band_h) // 2
-    y1 = y0 + band_h
-    band = overlay.copy()
-    cv2.rectangle(band, (0, y0), (w, y1), (0, 0, 0), -1)
-    overlay = cv2.addWeighted(band, 0.35, overlay, 0.65, 0)
-
-    text_label = "Suspend"
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    font_scale = max(1.2, w / 900.0)
-    thickness = max(2, int(w / 500))
-
-    (tw, th), _ = cv2.getTextSize(text_label, font, font_scale, thickness)
-    x = (w - tw) // 2
-    y = (h + th) // 2
+    # (= blending a black band at 35%; only the band rows are touched, in place)
+    strip = overlay[y0:y1 + 1]  # cv2.rectangle filled y1 inclusive
+    cv2.convertScaleAbs(strip, dst=strip, alpha=0.65, beta=0)
 
     # White text with dark outline for contrast (text itself not blurred)
-    cv2.putText(overlay, text_label, (x, y), font, font_scale, (0, 0, 0), thickness + 3, cv2.LINE_AA)
-    cv2.putText(overlay, text_label, (x, y), font, font_scale, (255, 255, 255), thickness, cv2.LINE_AA)
+    cv2.putText(overlay, _PAUSE_LABEL, text_origin, _PAUSE_FONT, font_scale, (0, 0, 0), thickness + 3, cv2.LINE_AA)
+    cv2.putText(overlay, _PAUSE_LABEL, text_origin, _PAUSE_FONT, font_scale, (255, 255, 255), thickness, cv2.LINE_AA)
 
     return overlay
+
+
+def _restart_if_signaled(signal_file_path):
+    if os.path.exists(signal_file_path):
+        logging.info("Signaldatei gefunden. Server wird neu gestartet...")
+        os.remove(signal_file_path)
+        os.kill(os.getpid(), signal.SIGTERM)
+
+
 def check_for_restart_signal(signal_file_path, interval=10):
+    """Restart (SIGTERM) once signal_file_path appears.
+
+    With inotify the thread just waits until the shared watcher stops; the restart itself
+    happens in the watcher callback. Otherwise (or once the watcher stops) the file is
+    polled every `interval` seconds.
+    """
+    watcher_stopped = threading.Event()
+    if watch_file(signal_file_path, lambda: _restart_if_signaled(signal_file_path),
+                  on_stop=watcher_stopped.set):
+        # Catch a signal file created before the watch was set up
+        _restart_if_signaled(signal_file_path)
+        watcher_stopped.wait()
+        logging.debug("Restart signal watcher stopped, polling instead")
     while True:
-        if os.path.exists(signal_file_path):
-            logging.info("Signaldatei gefunden. Server wird neu gestartet...")
-            os.remove(signal_file_path)
-            os.kill(os.getpid(), signal.SIGTERM)
+        _restart_if_signaled(signal_file_path)
         time.sleep(interval)
 
 
@@ -114,30 +181,83 @@ class VideoStreamingServer:
             return Response(stream_with_context(stream()), mimetype='multipart/x-mixed-replace; boundary=frame')
 
     def start_stream(self):
+        try:
+            quality = max(10, min(int(self.config_manager.get('stream_jpeg_quality', 80)), 100))
+        except Exception:
+            quality = 80
+        encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+        # One encoder per client: a TurboJPEG handle must not be shared between threads
+        tj = None
+        if TurboJPEG is not None:
+            try:
+                tj = TurboJPEG()
+            except Exception as e:
+                logging.debug(f"TurboJPEG unavailable, using cv2.imencode: {e}")
+
+        def encode(frame):
+            nonlocal tj
+            if tj is not None:
+                try:
+                    # BGR input as is, no color conversion
+                    return tj.encode(frame, quality=quality)
+                except Exception as e:
+                    logging.warning(f"TurboJPEG encode failed, falling back to cv2.imencode: {e}")
+                    tj = None
+            _, jpeg = cv2.imencode('.jpg', frame, encode_params)
+            return jpeg.tobytes()
+
         def generate():
             last_frame = None
+            # Digest and multipart chunk of the last encoded frame; duplicates pushed by
+            # the source (static RTSP scenes) are resent without another JPEG encode
+            last_digest = None
+            last_chunk = None
+            # Suspend image of last_frame, encoded once while last_frame stays the same
+            pause_jpeg = None
+            pause_src = None
+            # Frame pacing against a monotonic deadline: the time spent waiting for and
+            # encoding a frame counts towards the 1/30 s instead of adding to it
+            frame_interval = 1.0 / 30  # target 30 FPS
+            next_deadline = time.monotonic()
             while True:
                 try:
                     frame = self.frame_queue.get(timeout=1)
+                    # Serve the newest frame only: drop any backlog without encoding it
+                    # (a LatestFrameSlot never holds more than one frame, so this ends at once)
+                    try:
+                        while True:
+                            frame = self.frame_queue.get_nowait()
+                    except queue.Empty:
+                        pass
                     last_frame = frame
 
-                    _, jpeg = cv2.imencode('.jpg', frame)
-                    frame_data = jpeg.tobytes()
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + frame_data + b'\r\n')
+                    # Every 4th row is enough to tell repeated frames apart and far cheaper
+                    # than the encode it saves
+                    digest = hashlib.blake2b(frame[::4].tobytes(), digest_size=8)
+                    digest.update(repr(frame.shape).encode())
+                    digest = digest.digest()
+                    if digest != last_digest:
+                        last_chunk = _BOUNDARY + encode(frame) + b'\r\n'
+                        last_digest = digest
+                    yield last_chunk
 
-                    time.sleep(1.0 / 30)  # target 30 FPS
+                    next_deadline += frame_interval
+                    delay = next_deadline - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    elif delay < -0.5:
+                        # Far behind (stalled client/pipeline): restart pacing instead of bursting
+                        next_deadline = time.monotonic()
 
                 except queue.Empty:
                     suspend_enabled = bool(self.config_manager.get('enable_stream_suspend', False))
                     trigger_active = is_manual_trigger_active(self.config_manager)
 
                     if suspend_enabled and not trigger_active and last_frame is not None:
-                        paused = add_pause_overlay(last_frame)
-                        _, jpeg = cv2.imencode('.jpg', paused)
-                        frame_data = jpeg.tobytes()
-                        yield (b'--frame\r\n'
-                               b'Content-Type: image/jpeg\r\n\r\n' + frame_data + b'\r\n')
+                        if pause_src is not last_frame:
+                            pause_jpeg = _BOUNDARY + encode(add_pause_overlay(last_frame)) + b'\r\n'
+                            pause_src = last_frame
+                        yield pause_jpeg
                         time.sleep(1.0)  # 1 FPS reicht als "Suspend"-Bild völlig
                     else:
                         logging.debug("Warte auf Frames...")
@@ -153,5 +273,11 @@ class VideoStreamingServer:
     def stop_stream(self):
         logging.info("stream gestoppt")
 
+    # Worker threads of the WSGI server; every open MJPEG stream keeps one busy
+    SERVER_THREADS = 16
+
     def run(self):
+        if serve is not None:
+            serve(self.app, host='0.0.0.0', port=5001, threads=self.SERVER_THREADS)
+            return
         self.app.run(host='0.0.0.0', port=5001, threaded=True, use_reloader=False)
@@ -23,7 +23,7 @@ if not os.path.exists(known_faces_folder):
 # Erstellen der 'config.json'-Datei mit Standardwerten, falls nicht vorhanden
 if not os.path.isfile(config_file):
     with open(config_file, 'w') as config_file_handle:
-        json.dump(default_config, config_file_handle, indent=4)
+        json.dump(default_config, config_file_handle, indent=2)
 
 
 def main():
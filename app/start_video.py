@@ -1,11 +1,11 @@
 import logging
 import os
-import queue
+import signal
 from server.streaming.video import VideoStreamingServer
 from processor.frame import FrameProcessor
 from loader.face import FaceLoader
 from notification.service import NotificationService
-from manager.camera import CameraManager
+from manager.camera import CameraManager, LatestFrameSlot
 from config.manager import ConfigManager
 
 
@@ -19,9 +19,9 @@ def main():
     config_manager = ConfigManager(config_path)
     config_manager.load_config()
 
-    # Warteschlange für frames
-    frame_queue = queue.Queue(maxsize=1)
-    processed_frame_queue = queue.Queue(maxsize=1)
+    # Warteschlange für frames (Kamera -> Processor -> Stream: nur das neueste Frame zählt)
+    frame_queue = LatestFrameSlot()
+    processed_frame_queue = LatestFrameSlot()
     output_size = (config_manager.get('output_width'), config_manager.get('output_height'))
     # Starten des Kamera Managers
     camera_manager = CameraManager(frame_queue, config_manager.get('input_stream_url'), output_size, config_manager=config_manager)
@@ -38,6 +38,21 @@ def main():
                                      notification_service)
     frame_processor.start()
 
+    def shutdown(signum, frame):
+        # SIGTERM comes from supervisord and from the restart after every config save
+        # (check_for_restart_signal). atexit handlers don't run on a signal, so queued
+        # notifications and buffered event log lines are written out here.
+        logging.info("SIGTERM received, writing pending notifications before exit")
+        camera_manager.stop()
+        frame_processor.stop()
+        notification_service.drain()
+        notification_service.close()
+        logging.shutdown()
+        # Non-daemon camera/processor threads would otherwise keep the interpreter alive
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+
     server = VideoStreamingServer(config_manager, processed_frame_queue)
     server.run()
 